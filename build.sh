@@ -15,6 +15,14 @@ python manage.py collectstatic --noinput
 echo "🗄️  Running database migrations..."
 python manage.py migrate --noinput
 
+# Rebuild denormalized product cards
+echo "🃏 Rebuilding product cards..."
+python manage.py rebuild_product_cards
+
+# Pre-generate image renditions used by the templates
+echo "🖼️  Generating image renditions..."
+python manage.py generate_renditions || true
+
 # Create cache table
 echo "💾 Creating cache table..."
 python manage.py createcachetable || true
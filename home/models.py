@@ -48,11 +48,9 @@ class HomePage(Page):
         context = super().get_context(request)
         
         # Add featured products
-        from shop.models import ProductPage
-        context['featured_products'] = ProductPage.objects.live().public().filter(
-            is_featured=True,
-            is_available=True
-        )[:6]
+        from shop.catalog import bestsellers, listing_cards
+        context['featured_products'] = listing_cards(featured=True)[:6]
+        context['bestselling_products'] = bestsellers(limit=6)
         
         return context
     
@@ -0,0 +1,14 @@
+"""
+Signal handlers for home pages
+"""
+from django.dispatch import receiver
+from wagtail.signals import page_published
+
+from shop.renditions import HERO_IMAGE_RENDITIONS, ensure_renditions_safely
+from .models import HomePage
+
+
+@receiver(page_published, sender=HomePage)
+def hero_renditions(sender, instance, **kwargs):
+    """Pre-generate the hero image rendition"""
+    ensure_renditions_safely(instance.hero_image, HERO_IMAGE_RENDITIONS)
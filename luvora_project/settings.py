@@ -69,6 +69,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'shop.middleware.CartTokenMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'wagtail.contrib.redirects.middleware.RedirectMiddleware',
 ]
@@ -107,6 +108,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# Per-process memory by default; point CACHE_BACKEND at
+# django.core.cache.backends.redis.RedisCache (CACHE_LOCATION=redis://...)
+# in production so all workers share fragments and invalidations.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='luvora'),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -160,6 +172,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 WAGTAIL_SITE_NAME = config('WAGTAIL_SITE_NAME', default='LUVORA')
 WAGTAILADMIN_BASE_URL = config('SITE_URL', default='http://localhost:8000')
 
+# Search
+# The database backend picks PostgreSQL full-text search on Postgres and
+# SQLite FTS5 locally. SEARCH_CONFIG is the Postgres text search
+# configuration used for stemming (ignored on SQLite).
+WAGTAILSEARCH_BACKENDS = {
+    'default': {
+        'BACKEND': 'wagtail.search.backends.database',
+        'SEARCH_CONFIG': config('SEARCH_CONFIG', default='english'),
+        'AUTO_UPDATE': True,
+    }
+}
+
 # Email configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='')
@@ -170,6 +194,27 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@luvora.com')
 SITE_URL = config('SITE_URL', default='http://127.0.0.1:8000')
 
+# Shop listings
+SHOP_PRODUCTS_PER_PAGE = config('SHOP_PRODUCTS_PER_PAGE', default=24, cast=int)
+# Seconds anonymous catalog pages stay in the shared page cache (0 disables it)
+SHOP_PAGE_CACHE_TIMEOUT = config('SHOP_PAGE_CACHE_TIMEOUT', default=300, cast=int)
+# Memory cap of the per-worker typeahead index (number of indexed terms)
+SHOP_TYPEAHEAD_MAX_ENTRIES = config('SHOP_TYPEAHEAD_MAX_ENTRIES', default=200000, cast=int)
+# Product id range covered by each product sitemap (at most 50,000 URLs)
+SHOP_SITEMAP_CHUNK_SIZE = config('SHOP_SITEMAP_CHUNK_SIZE', default=5000, cast=int)
+
+# Cart storage: shop.cart_store.DatabaseCartStore or shop.cart_store.RedisCartStore
+SHOP_CART_STORE = config('SHOP_CART_STORE', default='shop.cart_store.DatabaseCartStore')
+# Redis URL for RedisCartStore (defaults to CACHE_LOCATION)
+SHOP_CART_REDIS_URL = config('SHOP_CART_REDIS_URL', default='')
+# Seconds a cart and its cookie live after the last change
+SHOP_CART_AGE = config('SHOP_CART_AGE', default=86400 * 30, cast=int)
+
+# Rows each coupon's redemption counter is spread over (more = less contention)
+SHOP_COUPON_SHARDS = config('SHOP_COUPON_SHARDS', default=8, cast=int)
+# Seconds a worker keeps its copy of the active coupons without re-checking
+SHOP_COUPON_CACHE_TTL = config('SHOP_COUPON_CACHE_TTL', default=60, cast=int)
+
 # Razorpay Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
@@ -180,7 +225,6 @@ SESSION_COOKIE_AGE = 86400 * 7  # 7 days
 SESSION_SAVE_EVERY_REQUEST = False
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = not DEBUG  # True in production with HTTPS
-# Note: Using default JSONSerializer - ensure no Decimal values stored in session (convert to float in cart.py)
 
 # Security settings for production
 if not DEBUG:
@@ -10,6 +10,8 @@ from wagtail.admin import urls as wagtailadmin_urls
 from wagtail.documents import urls as wagtaildocs_urls
 from wagtail import urls as wagtail_urls
 
+from shop import views as shop_views
+
 urlpatterns = [
     path('django-admin/', admin.site.urls),
     path('admin/', include(wagtailadmin_urls)),
@@ -18,6 +20,11 @@ urlpatterns = [
     # Shop URLs
     path('shop/', include('shop.urls', namespace='shop')),
     
+    # Sitemaps
+    path('sitemap.xml', shop_views.sitemap_index, name='sitemap'),
+    path('sitemap-catalog.xml', shop_views.sitemap_catalog, name='sitemap_catalog'),
+    path('sitemap-products-<int:chunk>.xml', shop_views.sitemap_products, name='sitemap_products'),
+    
     # Wagtail CMS (catch-all, should be last)
     path('', include(wagtail_urls)),
 ]
@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'luvora_project.settings')
 
 application = get_wsgi_application()
+
+# Build the per-worker typeahead index before the first request
+from shop.typeahead import warm_typeahead_index  # noqa: E402
+
+warm_typeahead_index()
@@ -2,6 +2,7 @@
 Django admin configuration for Shop models
 """
 from django.contrib import admin
+from django.db.models import Sum
 from .models import Category, Coupon, Order, OrderItem
 
 
@@ -17,10 +18,10 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
     list_display = ['code', 'discount_type', 'value', 'valid_from', 'valid_to', 
-                    'used_count', 'usage_limit', 'is_active']
+                    'times_used', 'usage_limit', 'is_active']
     list_filter = ['discount_type', 'is_active', 'valid_from', 'valid_to']
     search_fields = ['code', 'description']
-    readonly_fields = ['used_count', 'created_at', 'updated_at']
+    readonly_fields = ['times_used', 'created_at', 'updated_at']
     fieldsets = (
         ('Basic Information', {
             'fields': ('code', 'description', 'is_active')
@@ -32,13 +33,21 @@ class CouponAdmin(admin.ModelAdmin):
             'fields': ('valid_from', 'valid_to')
         }),
         ('Usage Limits', {
-            'fields': ('usage_limit', 'used_count')
+            'fields': ('usage_limit', 'times_used')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        # Redemptions are counted across the usage shards
+        return super().get_queryset(request).annotate(usage_total=Sum('usage_shards__used', default=0))
+    
+    @admin.display(description='Used', ordering='usage_total')
+    def times_used(self, obj):
+        return getattr(obj, 'usage_total', 0)
 
 
 class OrderItemInline(admin.TabularInline):
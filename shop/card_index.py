@@ -0,0 +1,95 @@
+"""
+Base class for in-process indexes over the ProductCard table
+
+Each worker keeps its own copy of an index and builds it from one query on
+first use. Writers bump a shared version number whenever a card changes;
+readers then patch their index from the rows whose updated_at moved past
+the index watermark. Removed cards leave no row to patch from, so removals
+bump a separate counter that makes every process rebuild instead.
+"""
+import threading
+from datetime import timedelta
+from django.core.cache import cache
+
+from .models import ProductCard
+
+VERSION_KEY = 'shop:card-index:version'
+REBUILD_KEY = 'shop:card-index:rebuild'
+
+# Rows committed slightly out of order are caught by re-reading this window
+WATERMARK_OVERLAP = timedelta(seconds=30)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_version():
+    """Tell every process that some product cards changed"""
+    _incr(VERSION_KEY)
+
+
+def request_rebuild():
+    """Tell every process that a product card was removed"""
+    _incr(REBUILD_KEY)
+
+
+class CardIndex:
+    """
+    An index kept up to date from the ProductCard change feed.
+
+    Subclasses list the card columns they need in `fields` (always
+    including 'pk') and implement load() and update().
+    """
+
+    fields = ('pk',)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.rebuild_version = None
+        self.built = False
+        self.watermark = None
+
+    def load(self, rows):
+        """Build the index from scratch from an iterable of card rows"""
+        raise NotImplementedError
+
+    def update(self, row):
+        """Apply one created or updated card row"""
+        raise NotImplementedError
+
+    def _rows(self, queryset):
+        for row in queryset.values(*self.fields, 'updated_at').iterator():
+            if self.watermark is None or row['updated_at'] > self.watermark:
+                self.watermark = row['updated_at']
+            yield row
+
+    def rebuild(self):
+        self.watermark = None
+        self.load(self._rows(ProductCard.objects.order_by('pk')))
+        self.built = True
+
+    def patch(self):
+        """Apply the cards created or updated since the watermark"""
+        changed = ProductCard.objects.all()
+        if self.watermark is not None:
+            changed = changed.filter(updated_at__gte=self.watermark - WATERMARK_OVERLAP)
+        for row in self._rows(changed):
+            self.update(row)
+
+    def refresh(self):
+        """Bring the index up to date with the other processes' changes"""
+        versions = cache.get_many([VERSION_KEY, REBUILD_KEY])
+        version, rebuild_version = versions.get(VERSION_KEY), versions.get(REBUILD_KEY)
+        if self.built and (version, rebuild_version) == (self.version, self.rebuild_version):
+            return
+        with self._lock:
+            if not self.built or rebuild_version != self.rebuild_version:
+                self.rebuild()
+            else:
+                self.patch()
+            self.version, self.rebuild_version = version, rebuild_version
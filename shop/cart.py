@@ -1,26 +1,128 @@
 """
-Shopping cart functionality using Django sessions
+Shopping cart functionality
 """
-from decimal import Decimal
-from copy import deepcopy
+import re
+import secrets
 from django.conf import settings
+from .cart_store import get_cart_store
+from .coupons import get_active_coupon, get_active_coupon_by_id
+from .catalog import HEAVY_PRODUCT_FIELDS
 from .models import ProductPage, Coupon
+from .money import format_rupees, to_paise
+
+DEFAULT_CART_COOKIE_NAME = 'luvora_cart'
+
+# Cart tokens are token_urlsafe(32): 43 URL-safe characters
+TOKEN_BYTES = 32
+TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+def cart_cookie_name():
+    return getattr(settings, 'SHOP_CART_COOKIE_NAME', DEFAULT_CART_COOKIE_NAME)
+
+
+def _valid_token(token):
+    return token if token and TOKEN_RE.match(token) else None
+
+
+class CartLine:
+    """
+    One product line of a cart.
+
+    Built from the stored line data once per Cart instance, with the price in
+    integer paise; the product is attached by a single query for all lines
+    (see Cart.lines).
+    """
+    __slots__ = ('product_id', 'product', 'quantity', 'unit_paise', 'sku', 'title', 'update_quantity_form')
+
+    def __init__(self, product_id, data):
+        self.product_id = product_id
+        self.product = None
+        self.quantity = data['quantity']
+        # Carts saved before prices were kept in paise still hold a 'price' string
+        self.unit_paise = data['price_paise'] if 'price_paise' in data else to_paise(data['price'])
+        self.sku = data['sku']
+        self.title = data['title']
+        # Set by cart_detail for the quantity form of each line
+        self.update_quantity_form = None
+
+    @property
+    def total_paise(self):
+        return self.unit_paise * self.quantity
 
 
 class Cart:
-    """Session-based shopping cart"""
+    """
+    Shopping cart kept in the configured cart store (shop.cart_store).
+
+    The cart is identified by a random token in its own cookie, issued on
+    the first write and set on the response by CartTokenMiddleware. Nothing
+    is read or written until the cart is used, and nothing is written until
+    a product is added or a coupon applied, so browsing visitors and
+    crawlers never create a cart or a session.
+    """
     
     def __init__(self, request):
         """Initialize the cart"""
-        self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID if hasattr(settings, 'CART_SESSION_ID') else 'cart')
-        
-        if not cart:
-            # Initialize empty cart
-            cart = self.session['cart'] = {}
-        
-        self.cart = cart
-        self._coupon_id = self.session.get('coupon_id')
+        self.request = request
+        self.store = get_cart_store()
+        self.token = getattr(request, 'cart_token', None) or _valid_token(
+            request.COOKIES.get(cart_cookie_name())
+        )
+        self._data = None
+        self._coupon_id = None
+        self._coupon = None
+        self._coupon_loaded = False
+        self._lines = None
+        self._products_loaded = False
+        self._legacy_checked = self.token is not None
+    
+    @property
+    def cart(self):
+        """Line data by product id, read from the store once per cart"""
+        if self._data is None:
+            self._import_session_cart()
+            if self.token:
+                self._data, self._coupon_id = self.store.load(self.token)
+            else:
+                self._data, self._coupon_id = {}, None
+        return self._data
+    
+    def _ensure_token(self):
+        """
+        The cart token for a write, issued on the first one.
+
+        Every write also renews the cookie, so the cart lives SHOP_CART_AGE
+        after its last change rather than its first.
+        """
+        self._import_session_cart()
+        if self.token is None:
+            self.token = secrets.token_urlsafe(TOKEN_BYTES)
+        self.request.cart_token = self.token
+        return self.token
+    
+    def _import_session_cart(self):
+        """Move a cart saved in the session by an older release to the store"""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        # Only visitors who already have a session can have a legacy cart
+        if settings.SESSION_COOKIE_NAME not in self.request.COOKIES:
+            return
+        session = self.request.session
+        legacy = session.get('cart')
+        if not legacy:
+            return
+        token = self.token = self.request.cart_token = secrets.token_urlsafe(TOKEN_BYTES)
+        for product_id, data in legacy.items():
+            line = CartLine(product_id, data)
+            self.store.add_line(token, int(product_id), {
+                'price_paise': line.unit_paise, 'sku': line.sku, 'title': line.title,
+            }, line.quantity, override=True)
+        if session.get('coupon_id'):
+            self.store.set_coupon_id(token, session['coupon_id'])
+        session.pop('cart', None)
+        session.pop('coupon_id', None)
     
     def add(self, product, quantity=1, override_quantity=False):
         """
@@ -31,72 +133,72 @@ class Cart:
             quantity: Quantity to add
             override_quantity: If True, set quantity instead of incrementing
         """
-        product_id = str(product.id)
-        
-        if product_id not in self.cart:
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(product.price),
-                'sku': product.sku,
-                'title': product.title,
-            }
-        
-        if override_quantity:
-            self.cart[product_id]['quantity'] = quantity
-        else:
-            self.cart[product_id]['quantity'] += quantity
-        
+        data = {
+            'price_paise': to_paise(product.price),
+            'sku': product.sku,
+            'title': product.title,
+        }
+        self.store.add_line(self._ensure_token(), product.id, data, quantity, override=override_quantity)
         self.save()
     
     def remove(self, product):
         """Remove a product from the cart"""
-        product_id = str(product.id)
-        
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if str(product.id) in self.cart:
+            self.store.remove_line(self._ensure_token(), product.id)
             self.save()
     
     def save(self):
-        """Mark session as modified to ensure it's saved"""
-        self.session.modified = True
+        """Drop what was read from the store so it is read again on next use"""
+        self._data = None
+        self._lines = None
+        self._products_loaded = False
+    
+    def _get_lines(self):
+        if self._lines is None:
+            self._lines = [CartLine(product_id, data) for product_id, data in self.cart.items()]
+        return self._lines
+    
+    def get_line(self, product_id):
+        """The line for a product id, without loading products, or None"""
+        product_id = str(product_id)
+        for line in self._get_lines():
+            if line.product_id == product_id:
+                return line
+        return None
+    
+    @property
+    def lines(self):
+        """Cart lines with their products, fetched in one query per cart"""
+        lines = self._get_lines()
+        if not self._products_loaded:
+            products = ProductPage.objects.filter(id__in=[line.product_id for line in lines])
+            products = {
+                str(product.id): product
+                for product in products.select_related('main_image').defer(*HEAVY_PRODUCT_FIELDS)
+            }
+            for line in lines:
+                line.product = products.get(line.product_id)
+            self._products_loaded = True
+        return lines
     
     def clear(self):
-        """Remove cart from session"""
-        del self.session['cart']
-        if 'coupon_id' in self.session:
-            del self.session['coupon_id']
+        """Delete the cart and its coupon"""
+        if self.token:
+            self.store.clear(self.token)
+        self._coupon, self._coupon_loaded = None, True
         self.save()
     
-    def get_total_price(self):
-        """Calculate total price of all items in cart"""
-        total = sum(
-            Decimal(item['price']) * item['quantity']
-            for item in self.cart.values()
-        )
-        return float(total)  # Convert to float for JSON serialization
+    def get_subtotal_paise(self):
+        """Total price of all items in cart, in paise"""
+        return sum(line.total_paise for line in self._get_lines())
     
     def get_total_quantity(self):
         """Get total number of items in cart"""
         return sum(item['quantity'] for item in self.cart.values())
     
     def __iter__(self):
-        """
-        Iterate over items in cart and get products from database
-        """
-        product_ids = self.cart.keys()
-        # Get products from database
-        products = ProductPage.objects.filter(id__in=product_ids)
-        # Use deepcopy to avoid modifying the original cart dict in session
-        cart = deepcopy(self.cart)
-        
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        
-        for item in cart.values():
-            # Keep price as string in session, convert to Decimal for calculations
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = float(item['price'] * item['quantity'])  # Convert to float for JSON
-            yield item
+        """Iterate over the cart lines, products included"""
+        return iter(self.lines)
     
     def __len__(self):
         """Count all items in cart"""
@@ -104,37 +206,40 @@ class Cart:
     
     @property
     def coupon(self):
-        """Get applied coupon if exists"""
-        if self._coupon_id:
-            try:
-                return Coupon.objects.get(id=self._coupon_id)
-            except Coupon.DoesNotExist:
-                pass
-        return None
+        """Get applied coupon if exists (looked up once per cart)"""
+        if not self._coupon_loaded:
+            self._coupon = None
+            # The coupon id is read from the store together with the lines
+            self.cart
+            if self._coupon_id:
+                self._coupon = get_active_coupon_by_id(self._coupon_id)
+                if self._coupon is None:
+                    # Deactivated or expired since it was applied
+                    self._coupon = Coupon.objects.filter(id=self._coupon_id).first()
+            self._coupon_loaded = True
+        return self._coupon
     
     @coupon.setter
     def coupon(self, coupon):
         """Set coupon for cart"""
         if coupon:
-            self.session['coupon_id'] = coupon.id
-        else:
-            if 'coupon_id' in self.session:
-                del self.session['coupon_id']
-        self.save()
+            self.store.set_coupon_id(self._ensure_token(), coupon.id)
+        elif self.token:
+            self.store.set_coupon_id(self._ensure_token(), None)
+        self._coupon, self._coupon_loaded = coupon, True
     
-    def get_discount(self):
-        """Get discount amount from coupon"""
+    def get_discount_paise(self):
+        """Discount from the applied coupon, in paise"""
         if self.coupon:
-            total = Decimal(str(self.get_total_price()))
-            is_valid, message = self.coupon.is_valid(total)
+            subtotal = self.get_subtotal_paise()
+            is_valid, message = self.coupon.is_valid(subtotal)
             if is_valid:
-                discount = self.coupon.calculate_discount(total)
-                return float(discount)  # Convert to float for JSON serialization
-        return 0.00  # Return float instead of Decimal
+                return self.coupon.calculate_discount(subtotal)
+        return 0
     
-    def get_total_price_after_discount(self):
-        """Get total price after applying discount"""
-        return self.get_total_price() - self.get_discount()  # Both are floats now
+    def get_total_paise(self):
+        """Total after the coupon discount, in paise"""
+        return self.get_subtotal_paise() - self.get_discount_paise()
     
     def apply_coupon(self, coupon_code):
         """
@@ -143,18 +248,20 @@ class Cart:
         Returns:
             tuple: (success: bool, message: str, coupon: Coupon or None)
         """
-        try:
-            coupon = Coupon.objects.get(code=coupon_code.upper())
-        except Coupon.DoesNotExist:
-            return False, "Invalid coupon code", None
+        coupon = get_active_coupon(coupon_code)
+        if coupon is None:
+            # Not active: look it up to say why
+            try:
+                coupon = Coupon.objects.get(code=coupon_code.upper())
+            except Coupon.DoesNotExist:
+                return False, "Invalid coupon code", None
         
-        total = Decimal(str(self.get_total_price()))
-        is_valid, message = coupon.is_valid(total)
+        is_valid, message = coupon.is_valid(self.get_subtotal_paise())
         
         if is_valid:
             self.coupon = coupon
-            discount = self.get_discount()
-            return True, f"Coupon applied! You saved ₹{discount}", coupon
+            discount = self.get_discount_paise()
+            return True, f"Coupon applied! You saved ₹{format_rupees(discount)}", coupon
         else:
             return False, message, None
     
@@ -170,28 +277,33 @@ class Cart:
             tuple: (is_valid: bool, errors: list)
         """
         errors = []
-        product_ids = self.cart.keys()
-        products = {str(p.id): p for p in ProductPage.objects.filter(id__in=product_ids)}
         
-        for product_id, item in self.cart.items():
-            if product_id not in products:
-                errors.append(f"Product {item['title']} is no longer available")
+        for line in self.lines:
+            product = line.product
+            if product is None:
+                errors.append(f"Product {line.title} is no longer available")
                 continue
             
-            product = products[product_id]
-            
             if not product.is_available:
                 errors.append(f"{product.title} is currently unavailable")
             
-            if not product.can_purchase(item['quantity']):
+            if not product.can_purchase(line.quantity):
                 errors.append(
                     f"{product.title}: Only {product.stock_quantity} items available "
-                    f"(you have {item['quantity']} in cart)"
+                    f"(you have {line.quantity} in cart)"
                 )
         
         return len(errors) == 0, errors
 
 
 def get_cart(request):
-    """Helper function to get cart instance"""
-    return Cart(request)
+    """
+    Return the request's cart, creating it on first use.
+
+    Views and the cart context processor share this one instance, so the
+    cart is read from the store and products and coupon are looked up once
+    per request.
+    """
+    if not hasattr(request, '_cart'):
+        request._cart = Cart(request)
+    return request._cart
@@ -0,0 +1,222 @@
+"""
+Cart storage backends for shop app
+
+Carts are kept apart from the Django session, keyed by a random token in
+their own cookie (see shop.cart and CartTokenMiddleware). Every write is a
+small atomic per-line operation - incrementing one line's quantity,
+deleting one line - so two tabs adding items at once can't overwrite each
+other, and the session row no longer carries the cart.
+
+SHOP_CART_STORE picks the backend:
+    shop.cart_store.DatabaseCartStore - StoredCart/StoredCartLine rows (default)
+    shop.cart_store.RedisCartStore - one Redis hash per cart (SHOP_CART_REDIS_URL)
+"""
+import json
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import StoredCart, StoredCartLine
+
+DEFAULT_CART_STORE = 'shop.cart_store.DatabaseCartStore'
+
+# Carts untouched for this long are dropped
+DEFAULT_CART_AGE = 60 * 60 * 24 * 30
+
+
+def cart_age():
+    """Seconds a cart (and its cookie) lives after its last change"""
+    return getattr(settings, 'SHOP_CART_AGE', DEFAULT_CART_AGE)
+
+
+class BaseCartStore:
+    """
+    Interface of a cart store.
+
+    Line data is a dict with quantity, price_paise, sku and title; lines
+    are keyed by the product id as a string.
+    """
+
+    def load(self, token):
+        """
+        Read a whole cart.
+
+        Returns:
+            tuple: ({product id: line data}, coupon id or None)
+        """
+        raise NotImplementedError
+
+    def add_line(self, token, product_id, data, quantity, override=False):
+        """
+        Add quantity to a line, or set it with override=True.
+
+        The price, SKU and title in `data` are only stored for a new line.
+        """
+        raise NotImplementedError
+
+    def remove_line(self, token, product_id):
+        raise NotImplementedError
+
+    def set_coupon_id(self, token, coupon_id):
+        """Apply a coupon to the cart, or remove it with None"""
+        raise NotImplementedError
+
+    def clear(self, token):
+        """Delete the cart with its lines and coupon"""
+        raise NotImplementedError
+
+    def delete_stale(self, before, limit=1000):
+        """
+        Delete up to `limit` carts last changed before a datetime.
+
+        Returns:
+            int: Number of carts deleted; 0 once none are left
+        """
+        raise NotImplementedError
+
+
+class DatabaseCartStore(BaseCartStore):
+    """Carts as StoredCart rows with one StoredCartLine row per product"""
+
+    def load(self, token):
+        # One query: the cart row outer-joined to its lines
+        rows = StoredCart.objects.filter(token=token).order_by('lines__pk').values_list(
+            'coupon_id', 'lines__product_id', 'lines__quantity', 'lines__price_paise', 'lines__sku', 'lines__title'
+        )
+        lines, coupon_id = {}, None
+        for coupon_id, product_id, quantity, price_paise, sku, title in rows:
+            if product_id is not None:
+                lines[str(product_id)] = {
+                    'quantity': quantity, 'price_paise': price_paise, 'sku': sku, 'title': title,
+                }
+        return lines, coupon_id
+
+    def _touch(self, token, **fields):
+        """Create the cart row or bump its updated_at"""
+        if StoredCart.objects.filter(token=token).update(updated_at=timezone.now(), **fields):
+            return
+        try:
+            with transaction.atomic():
+                StoredCart.objects.create(token=token, **fields)
+        except IntegrityError:
+            # Another request created the cart first
+            StoredCart.objects.filter(token=token).update(updated_at=timezone.now(), **fields)
+
+    @transaction.atomic
+    def add_line(self, token, product_id, data, quantity, override=False):
+        self._touch(token)
+        lines = StoredCartLine.objects.filter(cart_id=token, product_id=product_id)
+        new_quantity = quantity if override else F('quantity') + quantity
+        if lines.update(quantity=new_quantity):
+            return
+        try:
+            with transaction.atomic():
+                StoredCartLine.objects.create(
+                    cart_id=token, product_id=product_id, quantity=quantity,
+                    price_paise=data['price_paise'], sku=data['sku'], title=data['title'],
+                )
+        except IntegrityError:
+            # The same product was added from another tab at the same moment
+            lines.update(quantity=new_quantity)
+
+    @transaction.atomic
+    def remove_line(self, token, product_id):
+        self._touch(token)
+        StoredCartLine.objects.filter(cart_id=token, product_id=product_id).delete()
+
+    def set_coupon_id(self, token, coupon_id):
+        self._touch(token, coupon_id=coupon_id)
+
+    def clear(self, token):
+        StoredCart.objects.filter(token=token).delete()
+
+    def delete_stale(self, before, limit=1000):
+        stale = StoredCart.objects.filter(updated_at__lt=before)
+        tokens = list(stale.order_by('token').values_list('token', flat=True)[:limit])
+        if not tokens:
+            return 0
+        # Re-checked on delete: a cart written since the select stays
+        stale.filter(token__in=tokens).delete()
+        return len(tokens)
+
+
+class RedisCartStore(BaseCartStore):
+    """
+    Carts as one Redis hash each, expiring cart_age() after the last change.
+
+    Fields are q:<product id> (quantity, changed with HINCRBY), d:<product
+    id> (JSON price, SKU and title) and coupon. Works with any server that
+    speaks the Redis protocol.
+    """
+    key_prefix = 'shop:cart:'
+
+    def __init__(self, url=None):
+        import redis
+        url = url or getattr(settings, 'SHOP_CART_REDIS_URL', '') or settings.CACHES['default']['LOCATION']
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, token):
+        return f'{self.key_prefix}{token}'
+
+    def load(self, token):
+        fields = self.client.hgetall(self._key(token))
+        lines = {}
+        for field, value in fields.items():
+            field = field.decode()
+            if field.startswith('d:'):
+                product_id = field[2:]
+                quantity = int(fields.get(f'q:{product_id}'.encode(), 0))
+                if quantity > 0:
+                    lines[product_id] = dict(json.loads(value), quantity=quantity)
+        coupon_id = fields.get(b'coupon')
+        return lines, int(coupon_id) if coupon_id else None
+
+    def add_line(self, token, product_id, data, quantity, override=False):
+        key = self._key(token)
+        details = json.dumps({field: data[field] for field in ('price_paise', 'sku', 'title')})
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, f'd:{product_id}', details)
+            if override:
+                pipe.hset(key, f'q:{product_id}', quantity)
+            else:
+                pipe.hincrby(key, f'q:{product_id}', quantity)
+            pipe.expire(key, cart_age())
+            pipe.execute()
+
+    def remove_line(self, token, product_id):
+        key = self._key(token)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hdel(key, f'q:{product_id}', f'd:{product_id}')
+            pipe.expire(key, cart_age())
+            pipe.execute()
+
+    def set_coupon_id(self, token, coupon_id):
+        key = self._key(token)
+        with self.client.pipeline(transaction=True) as pipe:
+            if coupon_id:
+                pipe.hset(key, 'coupon', coupon_id)
+            else:
+                pipe.hdel(key, 'coupon')
+            pipe.expire(key, cart_age())
+            pipe.execute()
+
+    def clear(self, token):
+        self.client.delete(self._key(token))
+
+    def delete_stale(self, before, limit=1000):
+        # Redis expires carts by itself
+        return 0
+
+
+_store = None
+
+
+def get_cart_store():
+    """The configured cart store, created once per process"""
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'SHOP_CART_STORE', DEFAULT_CART_STORE))()
+    return _store
+
@@ -0,0 +1,265 @@
+"""
+Maintenance of the ProductCard read model used by catalog listings
+"""
+import logging
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from wagtail.images import get_image_model
+
+from .card_index import bump_version, request_rebuild
+from .models import Category, ProductPage, ProductCard, PRODUCT_LISTING_ORDERING
+from .page_cache import bump_generation
+from .sales import load_sales_counters
+
+logger = logging.getLogger(__name__)
+
+# Rendition used for product card thumbnails in listings
+PRODUCT_CARD_RENDITION = 'fill-400x300'
+
+# Products synced per transaction by rebuild_product_cards
+REBUILD_BATCH_SIZE = 500
+
+# Columns never needed to build a product card
+HEAVY_PRODUCT_FIELDS = ('description', 'meta_keywords', 'search_description', 'cost_price')
+
+# Listing sort options: key -> (label, ordering). Every ordering ends with
+# the pk so keyset pagination stays stable, and has a matching composite
+# index on ProductCard so a sorted page is an index range scan.
+PRODUCT_SORTS = {
+    'newest': ('Newest', PRODUCT_LISTING_ORDERING),
+    'price': ('Price: low to high', ('price', 'pk')),
+    'price-desc': ('Price: high to low', ('-price', '-pk')),
+    'discount': ('Biggest discount', ('-discount_percentage', '-pk')),
+    'in-stock': ('In stock first', ('-is_in_stock', '-first_published_at', '-pk')),
+    'bestsellers': ('Bestselling', ('-sales_30d', '-pk')),
+}
+DEFAULT_SORT = 'newest'
+
+
+def get_sort(params):
+    """
+    Read the `sort` query parameter.
+
+    Returns:
+        tuple: (sort key, ordering) - the default sort for unknown keys
+    """
+    key = params.get('sort')
+    if key not in PRODUCT_SORTS:
+        key = DEFAULT_SORT
+    return key, PRODUCT_SORTS[key][1]
+
+
+def sort_context(request, current_sort):
+    """Template context for the sort dropdown (includes/sort_options.html)"""
+    params = request.GET.copy()
+    for param in ('sort', 'cursor'):
+        params.pop(param, None)
+    return {
+        'sort_options': [(key, label) for key, (label, _) in PRODUCT_SORTS.items()],
+        'current_sort': current_sort,
+        'sort_hidden_params': [(name, value) for name, values in params.lists() for value in values],
+    }
+
+
+def listing_cards(category=None, featured=None, include_unavailable=False, ordering=PRODUCT_LISTING_ORDERING):
+    """
+    Queryset of product cards for a listing page.
+
+    Every catalog listing goes through here, so each one is a single query
+    on the narrow ProductCard table whatever the page size. A category
+    includes the products of its active subcategories - the ones the
+    category tree and facet counts show - and a hidden category none.
+    """
+    cards = ProductCard.objects.all()
+    if not include_unavailable:
+        cards = cards.filter(is_available=True)
+    if category is not None:
+        cards = cards.filter(category_id__in=_subtree_ids(Category.get_tree_node(category.pk)))
+    if featured is not None:
+        cards = cards.filter(is_featured=featured)
+    return cards.order_by(*ordering)
+
+
+def _subtree_ids(node):
+    """Ids of a category tree node and all its descendants"""
+    if node is None:
+        return []
+    ids = [node['id']]
+    for child in node['children']:
+        ids.extend(_subtree_ids(child))
+    return ids
+
+
+def bestsellers(category=None, limit=8):
+    """
+    Top-selling products of the last 30 days, optionally within a category.
+
+    Reads the rolling counters maintained by shop.sales, so this is an
+    index range scan rather than an aggregate over the order history.
+    """
+    ordering = PRODUCT_SORTS['bestsellers'][1]
+    return listing_cards(category=category, ordering=ordering).filter(sales_30d__gt=0)[:limit]
+
+
+def listing_products(queryset=None, renditions=(PRODUCT_CARD_RENDITION,)):
+    """
+    Queryset of product pages with everything a card needs loaded up front.
+
+    Category and image come from a join, the requested renditions are
+    prefetched in one query and the rich-text columns are deferred, so
+    iterating over N products costs a fixed number of queries.
+    """
+    if queryset is None:
+        queryset = ProductPage.objects.live().public()
+    Rendition = get_image_model().get_rendition_model()
+    return queryset.select_related('category', 'main_image').prefetch_related(
+        Prefetch(
+            'main_image__renditions',
+            queryset=Rendition.objects.filter(filter_spec__in=renditions),
+            to_attr='prefetched_renditions',
+        )
+    ).defer(*HEAVY_PRODUCT_FIELDS)
+
+
+def _thumbnail_url(product):
+    """Return the card thumbnail URL, generating the rendition if needed"""
+    if not product.main_image_id:
+        return ''
+    try:
+        return product.main_image.get_rendition(PRODUCT_CARD_RENDITION).url
+    except Exception as e:
+        logger.warning(f"Could not generate thumbnail for product {product.pk}: {str(e)}")
+        return ''
+
+
+def _published_at(product):
+    """
+    When the product first went live, for the newest-first listing order.
+
+    Pages made live without being published (add_child, imports) have no
+    first_published_at, so fall back to the closest date they do have.
+    """
+    return (
+        product.first_published_at
+        or product.last_published_at
+        or product.latest_revision_created_at
+        or timezone.now()
+    )
+
+
+def is_listable(product):
+    """Check if a product page is live and publicly visible"""
+    return ProductPage.objects.live().public().filter(pk=product.pk).exists()
+
+
+def sync_product_card(product, listable=None, bump=True):
+    """
+    Create, update or remove the ProductCard row for a product page.
+
+    Args:
+        product: ProductPage instance
+        listable: Skip the live/public check when already known
+        bump: Tell other processes about the change on commit; callers
+            syncing many cards in one transaction pass False and bump once
+
+    Returns the card, or None if the product should not be listed.
+    """
+    if listable is None:
+        listable = is_listable(product)
+    url = product.get_url() if listable else None
+    if bump:
+        # Cached catalog pages must not outlive this change
+        transaction.on_commit(bump_generation)
+    if not url:
+        if ProductCard.objects.filter(pk=product.pk).delete()[0] and bump:
+            transaction.on_commit(request_rebuild)
+        return None
+
+    if bump:
+        transaction.on_commit(bump_version)
+
+    card, created = ProductCard.objects.update_or_create(
+        product_id=product.pk,
+        defaults={
+            'title': product.title,
+            'sku': product.sku,
+            'url': url,
+            'short_description': product.short_description,
+            'price': product.price,
+            'compare_price': product.compare_price,
+            'discount_percentage': int(product.discount_percentage),
+            'is_in_stock': product.is_in_stock,
+            'is_available': product.is_available,
+            'is_featured': product.is_featured,
+            'category_id': product.category_id,
+            'thumbnail_url': _thumbnail_url(product),
+            'live_revision_id': product.live_revision_id,
+            'first_published_at': _published_at(product),
+        }
+    )
+    if created:
+        # Republished products pick their sales back up
+        load_sales_counters(card)
+    return card
+
+
+def sync_stock_state(product):
+    """Update only the in-stock flag after a stock change"""
+    transaction.on_commit(bump_generation)
+    transaction.on_commit(bump_version)
+    # update() skips auto_now, but the facet index relies on updated_at
+    ProductCard.objects.filter(pk=product.pk).update(
+        is_in_stock=product.is_in_stock, updated_at=timezone.now()
+    )
+
+
+def sync_product_cards(products):
+    """Re-sync the cards for a queryset of product pages"""
+    products = listing_products(products)
+    listable_ids = set(
+        ProductPage.objects.live().public()
+        .filter(pk__in=products.values('pk'))
+        .values_list('pk', flat=True)
+    )
+    count = 0
+    for product in products:
+        sync_product_card(product, listable=product.pk in listable_ids)
+        count += 1
+    return count
+
+
+def rebuild_product_cards(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Rebuild the whole read model from the page tree.
+
+    Products are synced in primary-key batches, each in its own short
+    transaction that bumps the page cache generation and card index
+    version once, so a large catalog never holds one long write
+    transaction or queues a callback per product.
+
+    Returns:
+        tuple: (synced: int, removed: int)
+    """
+    products = listing_products().order_by('pk')
+    synced = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for product in batch:
+                sync_product_card(product, listable=True, bump=False)
+            transaction.on_commit(bump_generation)
+            transaction.on_commit(bump_version)
+        synced += len(batch)
+        last_pk = batch[-1].pk
+
+    with transaction.atomic():
+        removed, _ = ProductCard.objects.exclude(
+            product_id__in=ProductPage.objects.live().public().values('pk')
+        ).delete()
+        transaction.on_commit(bump_generation)
+        transaction.on_commit(request_rebuild)
+    return synced, removed
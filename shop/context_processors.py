@@ -1,11 +1,17 @@
 """
 Context processor to make cart available in all templates
 """
-from .cart import Cart
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart
 
 
 def cart_context(request):
-    """Add cart to template context"""
+    """
+    Add cart to template context.
+
+    Lazy, so pages that never show the cart don't read the cart store.
+    """
     return {
-        'cart': Cart(request)
+        'cart': SimpleLazyObject(lambda: get_cart(request))
     }
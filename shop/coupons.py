@@ -0,0 +1,175 @@
+"""
+Coupon redemption counters and active-coupon cache for shop app
+
+A coupon's redemptions are counted in a few CouponUsageShard rows instead
+of one used_count column, so concurrent payments for a flash-sale coupon
+update different rows rather than queueing on one. The usage limit is
+split across the shards as capacities, and a redemption is a single
+conditional UPDATE (used = used + 1 WHERE used < capacity) on a shard with
+room left, so the limit holds exactly without locks or read-modify-write.
+
+Carts look coupons up in a per-process copy of the active ones instead of
+querying the Coupon table on every cart view. Coupon saves, deletes and
+coupons running out bump a shared version that makes every process reload
+its copy; a TTL picks up coupons whose validity window opens.
+"""
+import logging
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Coupon, CouponUsageShard
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUPON_SHARDS = 8
+DEFAULT_COUPON_CACHE_TTL = 60
+
+VERSION_KEY = 'shop:coupons:version'
+
+_HAS_ROOM = Q(capacity__isnull=True) | Q(used__lt=F('capacity'))
+
+
+def shard_count():
+    return getattr(settings, 'SHOP_COUPON_SHARDS', DEFAULT_COUPON_SHARDS)
+
+
+def split_evenly(total, parts):
+    """Split a total into `parts` integer shares differing by at most one"""
+    share, extra = divmod(total, parts)
+    return [share + (1 if index < extra else 0) for index in range(parts)]
+
+
+@transaction.atomic
+def sync_usage_shards(coupon):
+    """
+    Create a coupon's shards and share its remaining uses among them.
+
+    Called on every Coupon save, so changing usage_limit takes effect at
+    once; redemptions already counted stay in their shards.
+    """
+    wanted = shard_count()
+    shards = coupon.usage_shards.select_for_update().order_by('shard')
+    existing = {shard.shard for shard in shards}
+    missing = [index for index in range(wanted) if index not in existing]
+    if missing:
+        CouponUsageShard.objects.bulk_create(
+            [CouponUsageShard(coupon=coupon, shard=index) for index in missing],
+            ignore_conflicts=True,
+        )
+    shards = list(shards.all())
+
+    used = sum(shard.used for shard in shards)
+    if coupon.usage_limit:
+        shares = split_evenly(max(coupon.usage_limit - used, 0), len(shards))
+        for shard, share in zip(shards, shares):
+            shard.capacity = shard.used + share
+    else:
+        for shard in shards:
+            shard.capacity = None
+    CouponUsageShard.objects.bulk_update(shards, ['capacity'])
+    Coupon.objects.filter(pk=coupon.pk).update(used_count=used)
+    coupon.used_count = used
+    # After the used_count update, so no process caches the old count
+    transaction.on_commit(bump_coupon_version)
+
+
+def redeem_coupon(coupon):
+    """
+    Count one redemption of a coupon, never going past its usage limit.
+
+    Tries the shards that still have room in random order, each with one
+    conditional UPDATE; the first that succeeds counts the redemption.
+
+    Returns:
+        bool: False if the usage limit was already reached
+    """
+    shards = CouponUsageShard.objects.filter(coupon=coupon)
+    open_shards = list(shards.filter(_HAS_ROOM).values_list('shard', flat=True))
+    if not open_shards and not shards.exists():
+        # Coupon created without save() (bulk_create, fixtures)
+        sync_usage_shards(coupon)
+        open_shards = list(shards.filter(_HAS_ROOM).values_list('shard', flat=True))
+
+    random.shuffle(open_shards)
+    for index in open_shards:
+        if shards.filter(_HAS_ROOM, shard=index).update(used=F('used') + 1):
+            # Other shards may have filled up since they were listed
+            if coupon.usage_limit and not shards.filter(_HAS_ROOM).exists():
+                # That was the last use
+                _mark_used_up(coupon)
+            return True
+
+    _mark_used_up(coupon)
+    return False
+
+
+def _mark_used_up(coupon):
+    """Record on the coupon that every shard is full, so is_valid turns it away"""
+    coupon.used_count = coupon.usage_limit
+    if Coupon.objects.filter(pk=coupon.pk, used_count__lt=F('usage_limit')).update(used_count=F('usage_limit')):
+        logger.info(f"Coupon {coupon.code} reached its usage limit of {coupon.usage_limit}")
+        transaction.on_commit(bump_coupon_version)
+
+
+def usage_count(coupon):
+    """Redemptions counted so far"""
+    return coupon.usage_shards.aggregate(used=Sum('used', default=0))['used']
+
+
+def bump_coupon_version():
+    """Tell every process to reload its active coupons"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+class ActiveCoupons:
+    """
+    Per-process copy of the active, unexpired coupons by code and by id.
+
+    Loaded with one query, and again when the shared version changes or
+    SHOP_COUPON_CACHE_TTL seconds have passed. Coupons that are used up or
+    not yet valid stay in, so is_valid() can say why they don't apply.
+    The cached instances are shared between requests: don't modify them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_code = {}
+        self.by_id = {}
+        self.version = None
+        self.loaded_at = None
+
+    def refresh(self):
+        version = cache.get(VERSION_KEY)
+        ttl = getattr(settings, 'SHOP_COUPON_CACHE_TTL', DEFAULT_COUPON_CACHE_TTL)
+        if self.loaded_at is not None and version == self.version and time.monotonic() - self.loaded_at < ttl:
+            return
+        with self._lock:
+            coupons = list(Coupon.objects.filter(is_active=True, valid_to__gte=timezone.now()))
+            self.by_code = {coupon.code: coupon for coupon in coupons}
+            self.by_id = {coupon.pk: coupon for coupon in coupons}
+            self.version = version
+            self.loaded_at = time.monotonic()
+
+
+active_coupons = ActiveCoupons()
+
+
+def get_active_coupon(code):
+    """Active coupon for a code in any case, or None"""
+    active_coupons.refresh()
+    return active_coupons.by_code.get(code.upper())
+
+
+def get_active_coupon_by_id(coupon_id):
+    """Active coupon with this id, or None"""
+    active_coupons.refresh()
+    return active_coupons.by_id.get(coupon_id)
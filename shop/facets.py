@@ -0,0 +1,221 @@
+"""
+Faceted navigation for the product list
+
+Facet counts come from an in-process bitmap index over ProductCard rather
+than from one COUNT query per facet value. Each card gets a bit position;
+every facet value keeps a bitmap (a Python int) of the cards that have it,
+so the count for any option under the current selection is a couple of
+ANDs and a popcount. The index follows card changes through CardIndex.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import Q
+
+from .card_index import CardIndex
+from .models import Category
+
+PRICE_BUCKETS = [
+    ('under-500', 'Under ₹500', None, Decimal('500')),
+    ('500-1000', '₹500 - ₹1,000', Decimal('500'), Decimal('1000')),
+    ('1000-2500', '₹1,000 - ₹2,500', Decimal('1000'), Decimal('2500')),
+    ('2500-5000', '₹2,500 - ₹5,000', Decimal('2500'), Decimal('5000')),
+    ('over-5000', 'Over ₹5,000', Decimal('5000'), None),
+]
+
+DISCOUNT_THRESHOLDS = [
+    (10, '10% off or more'),
+    (25, '25% off or more'),
+    (50, '50% off or more'),
+]
+
+
+
+def price_bucket(price):
+    for key, _, low, high in PRICE_BUCKETS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return key
+    return None
+
+
+def facet_keys(row):
+    """Facet values of one ProductCard row (as returned by .values())"""
+    if not row['is_available']:
+        return set()
+    keys = {('all', None), ('price', price_bucket(row['price']))}
+    if row['category_id']:
+        keys.add(('category', row['category_id']))
+    if row['is_in_stock']:
+        keys.add(('in_stock', None))
+    if row['is_featured']:
+        keys.add(('featured', None))
+    for threshold, _ in DISCOUNT_THRESHOLDS:
+        if row['discount_percentage'] >= threshold:
+            keys.add(('discount', threshold))
+    return keys
+
+
+class FacetSelection:
+    """Facet filters selected in the query string"""
+
+    def __init__(self, params):
+        valid_buckets = {key for key, *_ in PRICE_BUCKETS}
+        self.prices = [value for value in params.getlist('price') if value in valid_buckets]
+        self.in_stock = params.get('in_stock') == '1'
+        self.featured = params.get('featured') == '1'
+        try:
+            self.discount = int(params.get('discount', ''))
+        except ValueError:
+            self.discount = None
+        if self.discount not in dict(DISCOUNT_THRESHOLDS):
+            self.discount = None
+
+    @property
+    def is_empty(self):
+        return not (self.prices or self.in_stock or self.featured or self.discount)
+
+    def apply(self, queryset):
+        """Filter a ProductCard queryset by the selection"""
+        if self.prices:
+            condition = Q()
+            for key, _, low, high in PRICE_BUCKETS:
+                if key in self.prices:
+                    bucket = Q()
+                    if low is not None:
+                        bucket &= Q(price__gte=low)
+                    if high is not None:
+                        bucket &= Q(price__lt=high)
+                    condition |= bucket
+            queryset = queryset.filter(condition)
+        if self.in_stock:
+            queryset = queryset.filter(is_in_stock=True)
+        if self.featured:
+            queryset = queryset.filter(is_featured=True)
+        if self.discount:
+            queryset = queryset.filter(discount_percentage__gte=self.discount)
+        return queryset
+
+
+class FacetIndex(CardIndex):
+    """Bitmap index of product card facet values"""
+
+    fields = ('pk', 'category_id', 'price', 'is_in_stock', 'is_featured',
+              'discount_percentage', 'is_available')
+
+    def __init__(self):
+        super().__init__()
+        self.positions = {}
+        self.card_keys = {}
+        self.bitmaps = defaultdict(int)
+
+    def load(self, rows):
+        positions, card_keys, members = {}, {}, defaultdict(list)
+        for row in rows:
+            position = positions[row['pk']] = len(positions)
+            card_keys[position] = facet_keys(row)
+            for key in card_keys[position]:
+                members[key].append(position)
+
+        size = (len(positions) + 7) // 8
+        bitmaps = defaultdict(int)
+        for key, key_positions in members.items():
+            bits = bytearray(size)
+            for position in key_positions:
+                bits[position >> 3] |= 1 << (position & 7)
+            bitmaps[key] = int.from_bytes(bits, 'little')
+
+        self.positions, self.card_keys, self.bitmaps = positions, card_keys, bitmaps
+
+    def update(self, row):
+        position = self.positions.get(row['pk'])
+        if position is None:
+            position = self.positions[row['pk']] = len(self.positions)
+        keys = facet_keys(row)
+        bit = 1 << position
+        for key in self.card_keys.get(position, set()) - keys:
+            self.bitmaps[key] &= ~bit
+        for key in keys - self.card_keys.get(position, set()):
+            self.bitmaps[key] |= bit
+        self.card_keys[position] = keys
+
+    def bitmap(self, facet, value=None):
+        return self.bitmaps.get((facet, value), 0)
+
+    def category_bitmap(self, node):
+        """Cards in a category tree node (dict from Category.get_tree()) or its subtree"""
+        bits = self.bitmap('category', node['id'])
+        for child in node['children']:
+            bits |= self.category_bitmap(child)
+        return bits
+
+    def _selection_bitmaps(self, selection, category_node):
+        """Bitmap of the cards matching each selected facet"""
+        selected = {}
+        if category_node is not None:
+            selected['category'] = self.category_bitmap(category_node)
+        if selection.prices:
+            bits = 0
+            for key in selection.prices:
+                bits |= self.bitmap('price', key)
+            selected['price'] = bits
+        if selection.in_stock:
+            selected['in_stock'] = self.bitmap('in_stock')
+        if selection.featured:
+            selected['featured'] = self.bitmap('featured')
+        if selection.discount:
+            selected['discount'] = self.bitmap('discount', selection.discount)
+        return selected
+
+    def counts(self, selection, category_tree, category_node=None):
+        """
+        Count the cards for every facet option under the current selection.
+
+        Each facet is counted against the other facets' selections, so
+        choosing a price bucket doesn't zero out the other price buckets.
+        """
+        selected = self._selection_bitmaps(selection, category_node)
+
+        def base(excluding):
+            bits = self.bitmap('all')
+            for facet, facet_bits in selected.items():
+                if facet != excluding:
+                    bits &= facet_bits
+            return bits
+
+        def annotate(nodes, bits):
+            return [
+                dict(node, count=(bits & self.category_bitmap(node)).bit_count(),
+                     children=annotate(node['children'], bits))
+                for node in nodes
+            ]
+
+        price_base, discount_base = base('price'), base('discount')
+        return {
+            'total': base(None).bit_count(),
+            'categories': annotate(category_tree, base('category')),
+            'prices': [
+                {'key': key, 'label': label, 'count': (price_base & self.bitmap('price', key)).bit_count(),
+                 'selected': key in selection.prices}
+                for key, label, _, _ in PRICE_BUCKETS
+            ],
+            'in_stock': (base('in_stock') & self.bitmap('in_stock')).bit_count(),
+            'featured': (base('featured') & self.bitmap('featured')).bit_count(),
+            'discounts': [
+                {'key': threshold, 'label': label,
+                 'count': (discount_base & self.bitmap('discount', threshold)).bit_count(),
+                 'selected': selection.discount == threshold}
+                for threshold, label in DISCOUNT_THRESHOLDS
+            ],
+        }
+
+
+facet_index = FacetIndex()
+
+
+def facet_counts(selection, category=None):
+    """Facet counts for the product list sidebar"""
+    facet_index.refresh()
+    category_node = None
+    if category is not None:
+        # A hidden category lists nothing, like listing_cards()
+        category_node = Category.get_tree_node(category.pk) or {'id': None, 'children': []}
+    return facet_index.counts(selection, Category.get_tree(), category_node)
@@ -0,0 +1,79 @@
+"""
+Public JSON catalog feed for shop app
+
+The feed is streamed row by row from a server-side cursor, so memory stays
+flat however large the catalog is. Its ETag is derived from the catalog
+state alone, so clients and CDNs revalidating an unchanged catalog get a
+304 without the feed being serialized again.
+"""
+import hashlib
+import json
+from django.db.models import Count, Max
+
+from .models import Category, ProductCard
+
+# Bump when the shape of a feed item changes
+FEED_VERSION = 1
+
+# Rows fetched per round trip from the server-side cursor
+FEED_CHUNK_SIZE = 500
+
+# Rows encoded per chunk written to the response
+FEED_WRITE_BATCH = 100
+
+FEED_FIELDS = (
+    'pk', 'title', 'sku', 'url', 'short_description', 'price', 'compare_price',
+    'thumbnail_url', 'is_in_stock', 'category__name', 'category__slug',
+)
+
+
+def catalog_etag(request=None):
+    """
+    Strong ETag for the feed.
+
+    Every card write (publish, unpublish, stock change) moves the newest
+    updated_at or the row count; category renames move the category
+    timestamp. Takes the request argument so it can be used with
+    django.views.decorators.http.condition.
+    """
+    cards = ProductCard.objects.filter(is_available=True).aggregate(
+        latest=Max('updated_at'), total=Count('pk')
+    )
+    categories = Category.objects.aggregate(latest=Max('updated_at'))
+    state = f"{FEED_VERSION}:{cards['latest']}:{cards['total']}:{categories['latest']}"
+    return hashlib.sha256(state.encode('utf-8')).hexdigest()[:32]
+
+
+def feed_item(row):
+    """Shape one card row like the static catalog's products.json entries"""
+    return {
+        'id': row['pk'],
+        'name': row['title'],
+        'sku': row['sku'],
+        'slug': row['url'].rstrip('/').rsplit('/', 1)[-1],
+        'url': row['url'],
+        'price': float(row['price']),
+        'comparePrice': float(row['compare_price']) if row['compare_price'] is not None else None,
+        'category': row['category__name'] or '',
+        'categorySlug': row['category__slug'] or '',
+        'image': row['thumbnail_url'],
+        'description': row['short_description'],
+        'inStock': row['is_in_stock'],
+    }
+
+
+def stream_catalog():
+    """Yield the JSON array of all listable products in chunks"""
+    rows = ProductCard.objects.filter(is_available=True).order_by('pk').values(*FEED_FIELDS)
+    yield '['
+    batch = []
+    first = True
+    for row in rows.iterator(chunk_size=FEED_CHUNK_SIZE):
+        batch.append(json.dumps(feed_item(row), ensure_ascii=False, separators=(',', ':')))
+        if len(batch) >= FEED_WRITE_BATCH:
+            yield ('' if first else ',') + ','.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ',') + ','.join(batch)
+    yield ']'
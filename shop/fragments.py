@@ -0,0 +1,55 @@
+"""
+Fragment cache for rendered product cards
+
+Card markup is the same for every visitor and only changes when the card
+row does - a product is republished, its stock flips, its page moves or its
+image is replaced - so each card is cached under a key made of the product
+id, its live revision id, its stock state and the card's updated_at.
+Listings fetch all their cards with a single cache.get_many() call.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import ProductCard
+
+PRODUCT_CARD_TEMPLATE = 'shop/includes/product_card.html'
+PRODUCT_CARD_TEMPLATES = (
+    PRODUCT_CARD_TEMPLATE,
+    'shop/includes/product_card_compact.html',
+)
+
+# Bump when the card templates change to drop every cached fragment
+CARD_FRAGMENT_VERSION = 1
+CARD_FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def card_fragment_key(card, template_name=PRODUCT_CARD_TEMPLATE):
+    return (
+        f'shop:card:v{CARD_FRAGMENT_VERSION}:{template_name}:'
+        f'{card.pk}:{card.live_revision_id}:{int(card.is_in_stock)}:'
+        f'{int(card.updated_at.timestamp() * 1000000)}'
+    )
+
+
+def render_product_cards(cards, template_name=PRODUCT_CARD_TEMPLATE):
+    """Render a list of product cards, reusing cached fragments where possible"""
+    keys = [card_fragment_key(card, template_name) for card in cards]
+    fragments = cache.get_many(keys)
+
+    rendered = {}
+    for key, card in zip(keys, cards):
+        if key not in fragments:
+            rendered[key] = render_to_string(template_name, {'product': card})
+    if rendered:
+        cache.set_many(rendered, CARD_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+
+    return mark_safe(''.join(fragments[key] for key in keys))
+
+
+def invalidate_card_fragments(product_id):
+    """Drop the cached fragments for a product's current card"""
+    card = ProductCard.objects.filter(pk=product_id).only('live_revision_id', 'is_in_stock', 'updated_at').first()
+    if card:
+        cache.delete_many([card_fragment_key(card, name) for name in PRODUCT_CARD_TEMPLATES])
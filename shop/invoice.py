@@ -11,6 +11,8 @@ from reportlab.lib.enums import TA_RIGHT, TA_CENTER
 from django.conf import settings
 import os
 
+from .money import format_rupees, to_paise
+
 
 def generate_invoice_pdf(order):
     """
@@ -102,25 +104,27 @@ def generate_invoice_pdf(order):
             item.product_name,
             item.product_sku,
             str(item.quantity),
-            f'₹{item.product_price:.2f}',
-            f'₹{item.get_total_price():.2f}'
+            f'₹{format_rupees(to_paise(item.product_price))}',
+            f'₹{format_rupees(item.line_total_paise)}'
         ])
     
     # Totals
-    items_data.append(['', '', '', 'Subtotal:', f'₹{order.subtotal:.2f}'])
+    items_data.append(['', '', '', 'Subtotal:', f'₹{format_rupees(order.subtotal_paise)}'])
     
-    if order.discount_amount > 0:
-        items_data.append(['', '', '', 'Discount:', f'-₹{order.discount_amount:.2f}'])
+    if order.discount_paise > 0:
+        items_data.append(['', '', '', 'Discount:', f'-₹{format_rupees(order.discount_paise)}'])
         if order.coupon_code:
             items_data.append(['', '', '', f'Coupon ({order.coupon_code}):', ''])
     
-    if order.shipping_cost > 0:
-        items_data.append(['', '', '', 'Shipping:', f'₹{order.shipping_cost:.2f}'])
+    shipping_paise = to_paise(order.shipping_cost)
+    if shipping_paise > 0:
+        items_data.append(['', '', '', 'Shipping:', f'₹{format_rupees(shipping_paise)}'])
     
-    if order.tax_amount > 0:
-        items_data.append(['', '', '', 'Tax:', f'₹{order.tax_amount:.2f}'])
+    tax_paise = to_paise(order.tax_amount)
+    if tax_paise > 0:
+        items_data.append(['', '', '', 'Tax:', f'₹{format_rupees(tax_paise)}'])
     
-    items_data.append(['', '', '', 'Total:', f'₹{order.total:.2f}'])
+    items_data.append(['', '', '', 'Total:', f'₹{format_rupees(order.total_paise)}'])
     
     # Create table
     items_table = Table(items_data, colWidths=[3*inch, 1.2*inch, 0.8*inch, 1*inch, 1*inch])
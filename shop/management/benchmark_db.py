@@ -0,0 +1,32 @@
+"""
+Throwaway databases for the benchmark management commands
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(name, keep=False):
+    """
+    Run a benchmark against a fresh, fully migrated database.
+
+    The database uses the configured engine, so benchmarks never seed the
+    real catalog. SQLite test databases default to in-memory, so on SQLite
+    it is a file next to the real database instead, timed on disk like it.
+
+    Args:
+        name: Short name for the database, e.g. 'search_benchmark'
+        keep: Keep the database (and reuse a kept one) instead of destroying it
+
+    Yields:
+        str: The benchmark database name
+    """
+    if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+        real_name = Path(connection.settings_dict['NAME'])
+        connection.settings_dict['TEST']['NAME'] = str(real_name.with_name(f'{real_name.stem}_{name}.sqlite3'))
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=keep, serialize=False)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
@@ -0,0 +1,119 @@
+"""
+Management command to measure the per-request cost of the cart
+Seeds live products into a throwaway database, fills carts of different
+sizes with them and times the cart work a cart page does: validating the
+lines, iterating them and computing the totals. Reports time and queries
+per request.
+"""
+import logging
+import secrets
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from wagtail.models import Page
+
+from shop.cart import cart_cookie_name, get_cart
+from shop.cart_store import get_cart_store
+from shop.money import to_paise
+from shop.management.benchmark_db import benchmark_database
+from shop.models import ProductIndexPage, ProductPage
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cart iteration, validation and totals for different cart sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines',
+            type=int,
+            nargs='+',
+            default=[1, 20, 100],
+            help='Cart sizes (number of distinct products) to benchmark'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Simulated requests per cart size'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['lines']) < 1:
+            raise CommandError('--lines must be at least 1')
+
+        with benchmark_database('cart_benchmark') as database:
+            self.stdout.write(f'Benchmark database: {database}')
+            self._run(options)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    @transaction.atomic
+    def _seed(self, count):
+        """Live, in-stock products for the carts"""
+        logging.getLogger('wagtail').setLevel(logging.WARNING)
+        index = ProductIndexPage(title='Cart benchmark', slug='cart-benchmark', live=True)
+        Page.get_first_root_node().add_child(instance=index)
+        return [
+            index.add_child(instance=ProductPage(
+                title=f'Cart benchmark product {number}',
+                slug=f'cart-bench-{number}',
+                sku=f'CARTBENCH{number:04d}',
+                price=Decimal(100 + number),
+                stock_quantity=1000,
+                live=True,
+                first_published_at=timezone.now(),
+            ))
+            for number in range(count)
+        ]
+
+    def _run(self, options):
+        products = self._seed(max(options['lines']))
+        store = get_cart_store()
+        factory = RequestFactory()
+
+        for size in options['lines']:
+            token = secrets.token_urlsafe(32)
+            for product in products[:size]:
+                store.add_line(token, product.pk, {
+                    'price_paise': to_paise(product.price),
+                    'sku': product.sku,
+                    'title': product.title,
+                }, 1)
+
+            timings, queries = [], 0
+            try:
+                for _ in range(options['requests']):
+                    request = factory.get('/shop/cart/')
+                    request.COOKIES[cart_cookie_name()] = token
+
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        self._cart_page(request)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries += len(captured.captured_queries)
+            finally:
+                store.clear(token)
+
+            timings.sort()
+            self.stdout.write(
+                f'{size} line(s): mean {statistics.mean(timings):.2f}ms, '
+                f'p95 {timings[int(len(timings) * 0.95)]:.2f}ms, '
+                f'{queries / options["requests"]:.0f} queries per request'
+            )
+
+    def _cart_page(self, request):
+        """The cart work of cart_detail plus the totals its template shows"""
+        cart = get_cart(request)
+        cart.validate_items()
+        for line in cart:
+            line.total_paise
+        # The template reaches the same cart through the context processor
+        cart = get_cart(request)
+        cart.get_subtotal_paise()
+        cart.get_total_paise()
+        len(cart)
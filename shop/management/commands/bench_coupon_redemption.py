@@ -0,0 +1,131 @@
+"""
+Management command to benchmark coupon redemption under concurrent payments
+Many threads (each with its own database connection) redeem one
+flash-sale style coupon at once, first with the old read-modify-write
+(used_count += 1; save()), then with the sharded conditional UPDATE of
+shop.coupons. Reports throughput, lost updates and how far each went past
+the usage limit. Run it against the production database engine: SQLite
+serializes all writes, so it shows correctness but not the contention win.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import override_settings
+from django.utils import timezone
+
+from shop.coupons import redeem_coupon, usage_count
+from shop.models import Coupon
+
+
+def _old_increment(coupon_id):
+    """The old Coupon.increment_usage: read, add one in Python, write the value back"""
+    coupon = Coupon.objects.get(pk=coupon_id)
+    coupon.used_count += 1
+    Coupon.objects.filter(pk=coupon_id).update(used_count=coupon.used_count)
+    return True
+
+
+def _sharded_redeem(coupon_id):
+    return redeem_coupon(Coupon.objects.get(pk=coupon_id))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent coupon redemption: read-modify-write vs sharded counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Usage limit of the benchmark coupon'
+        )
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=400,
+            help='Redemption attempts in total'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Concurrent payment threads'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=None,
+            help='Counter shards per coupon (default: SHOP_COUPON_SHARDS)'
+        )
+
+    def handle(self, *args, **options):
+        shard_settings = {'SHOP_COUPON_SHARDS': options['shards']} if options['shards'] else {}
+        with override_settings(**shard_settings):
+            for label, redeem in (('read-modify-write', _old_increment), ('sharded', _sharded_redeem)):
+                coupon = self._create_coupon(options['limit'])
+                try:
+                    self._run(label, redeem, coupon, options)
+                finally:
+                    coupon.delete()
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def _create_coupon(self, limit):
+        now = timezone.now()
+        return Coupon.objects.create(
+            code=f'BENCH-REDEEM-{int(now.timestamp() * 1000)}',
+            discount_type=Coupon.PERCENT,
+            value=Decimal('25'),
+            valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1),
+            usage_limit=limit,
+        )
+
+    def _run(self, label, redeem, coupon, options):
+        threads = options['threads']
+        per_thread = [options['payments'] // threads + (1 if i < options['payments'] % threads else 0)
+                      for i in range(threads)]
+        results = {'accepted': 0, 'refused': 0, 'errors': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(attempts):
+            accepted = refused = errors = 0
+            try:
+                barrier.wait()
+                for _ in range(attempts):
+                    try:
+                        if redeem(coupon.pk):
+                            accepted += 1
+                        else:
+                            refused += 1
+                    except OperationalError:
+                        # e.g. SQLite "database is locked"
+                        errors += 1
+            finally:
+                connection.close()
+                with lock:
+                    results['accepted'] += accepted
+                    results['refused'] += refused
+                    results['errors'] += errors
+
+        workers = [threading.Thread(target=worker, args=(attempts,)) for attempts in per_thread]
+        start = time.monotonic()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        coupon.refresh_from_db()
+        counted = usage_count(coupon) if label == 'sharded' else coupon.used_count
+        self.stdout.write(
+            f'{label}: {options["payments"] / elapsed:.0f} redemptions/s, '
+            f'{results["accepted"]} accepted, {results["refused"]} refused, {results["errors"]} error(s); '
+            f'counted {counted} (limit {coupon.usage_limit}), '
+            f'lost updates {results["accepted"] - counted}, '
+            f'over limit {max(results["accepted"] - coupon.usage_limit, 0)}'
+        )
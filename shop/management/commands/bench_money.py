@@ -0,0 +1,83 @@
+"""
+Management command to benchmark cart totals and coupon evaluation
+Compares integer-paise arithmetic (shop.money) with the Decimal/float
+round trips the cart used to do. Runs in memory - no database needed.
+"""
+import random
+import timeit
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+
+from shop.cart import CartLine
+from shop.models import Coupon
+from shop.money import to_paise
+
+
+def _decimal_total(cart_data):
+    """Cart total the old way: Decimal per line, float result"""
+    total = sum(Decimal(item['price']) * item['quantity'] for item in cart_data.values())
+    return float(total)
+
+
+def _decimal_discount(coupon, total):
+    """Coupon evaluation the old way: float total back through str to Decimal"""
+    total = Decimal(str(total))
+    if coupon.discount_type == Coupon.PERCENT:
+        discount = total * (coupon.value / Decimal('100'))
+    else:
+        discount = coupon.value
+    return float(min(discount, total))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark integer-paise cart totals and coupon evaluation against Decimal/float'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines',
+            type=int,
+            nargs='+',
+            default=[1, 20, 100],
+            help='Cart sizes to benchmark'
+        )
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=2000,
+            help='Repetitions per measurement'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        number = options['number']
+        coupon = Coupon(code='BENCH', discount_type=Coupon.PERCENT, value=Decimal('12.50'))
+
+        for size in options['lines']:
+            prices = [Decimal(rng.randint(100, 999999)) / 100 for _ in range(size)]
+            decimal_cart = {
+                str(pk): {'quantity': rng.randint(1, 5), 'price': str(price), 'sku': '', 'title': ''}
+                for pk, price in enumerate(prices)
+            }
+            paise_cart = {
+                pk: {'quantity': item['quantity'], 'price_paise': to_paise(item['price']), 'sku': '', 'title': ''}
+                for pk, item in decimal_cart.items()
+            }
+            lines = [CartLine(pk, data) for pk, data in paise_cart.items()]
+
+            old_total = self._time(lambda: _decimal_total(decimal_cart), number)
+            new_total = self._time(lambda: sum(line.total_paise for line in lines), number)
+            total_float = _decimal_total(decimal_cart)
+            total_paise = sum(line.total_paise for line in lines)
+            old_coupon = self._time(lambda: _decimal_discount(coupon, total_float), number)
+            new_coupon = self._time(lambda: coupon.calculate_discount(total_paise), number)
+
+            self.stdout.write(
+                f'{size} line(s): totals {old_total:.2f}us -> {new_total:.2f}us, '
+                f'coupon {old_coupon:.2f}us -> {new_coupon:.2f}us (Decimal/float -> paise)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def _time(self, func, number):
+        """Best of five runs, in microseconds per call"""
+        return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
@@ -0,0 +1,170 @@
+"""
+Management command to measure product search latency at catalog scale
+Creates a throwaway database next to the configured one (same engine,
+fully migrated), seeds synthetic products and categories into it, runs a
+fixed query workload against the configured search backend and reports
+percentiles. The real catalog, its search index, listings and sitemaps
+are never touched.
+"""
+import logging
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from wagtail.models import Page
+
+from shop.management.benchmark_db import benchmark_database
+from shop.models import Category, ProductIndexPage, ProductPage
+from shop.search import search_backend_name, search_products
+
+ADJECTIVES = ['classic', 'premium', 'compact', 'wireless', 'organic', 'handmade', 'vintage', 'smart',
+              'portable', 'waterproof', 'lightweight', 'ergonomic', 'luxury', 'everyday', 'eco']
+MATERIALS = ['cotton', 'leather', 'steel', 'bamboo', 'wool', 'ceramic', 'glass', 'silk', 'linen', 'oak']
+NOUNS = ['headphones', 'backpack', 'lamp', 'kettle', 'notebook', 'jacket', 'sneakers', 'mug', 'speaker',
+         'watch', 'blanket', 'wallet', 'bottle', 'chair', 'scarf', 'keyboard', 'candle', 'yoga mat']
+FILLER = ['durable', 'design', 'comfort', 'daily', 'gift', 'travel', 'home', 'office', 'quality',
+          'soft', 'finish', 'warranty', 'easy', 'clean', 'modern']
+
+CATEGORY_TREE = {
+    'Electronics': ['Audio', 'Computing', 'Lighting'],
+    'Home': ['Kitchen', 'Furniture', 'Decor'],
+    'Fashion': ['Clothing', 'Shoes', 'Accessories'],
+    'Sports': ['Fitness', 'Outdoor', 'Travel'],
+}
+
+BENCH_SLUG = 'search-benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark product search latency at different catalog sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000],
+            help='Catalog sizes (number of synthetic products) to benchmark'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of queries to run per catalog size'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the benchmark database, and the products seeded into it, for the next run'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Search backend: {search_backend_name()}')
+        with benchmark_database('search_benchmark', keep=options['keep']) as database:
+            self.stdout.write(f'Benchmark database: {database}')
+            self._run(options)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def _run(self, options):
+        bench_index = self._get_bench_index()
+        rng = random.Random(42)
+        categories = self._get_categories()
+        leaves = [category for category in categories if category.parent_id]
+
+        for size in sorted(options['sizes']):
+            existing = ProductPage.objects.child_of(bench_index).count()
+            if existing < size:
+                self.stdout.write(f'Seeding {size - existing} product(s)...')
+                started = time.perf_counter()
+                self._seed(bench_index, existing, size, rng, leaves)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  seeded in {elapsed:.1f}s')
+
+            queries = self._workload(rng, options['queries'], size)
+            self._report(f'{size} products', queries)
+            # A top-level category, so the filter covers a subtree
+            self._report(
+                f'{size} products, category + available filters',
+                queries, category=categories[0], available_only=True
+            )
+
+    def _get_bench_index(self):
+        existing = ProductIndexPage.objects.filter(slug=BENCH_SLUG).first()
+        if existing:
+            return existing
+        bench_index = ProductIndexPage(title='Search benchmark', slug=BENCH_SLUG, live=True)
+        Page.get_first_root_node().add_child(instance=bench_index)
+        return bench_index
+
+    def _get_categories(self):
+        """The benchmark category tree, top-level categories first"""
+        if not Category.objects.exists():
+            for name, children in CATEGORY_TREE.items():
+                parent = Category.objects.create(name=name, slug=name.lower())
+                for child in children:
+                    Category.objects.create(name=child, slug=child.lower(), parent=parent)
+        return list(Category.objects.order_by('depth', 'pk'))
+
+    def _seed(self, bench_index, start, end, rng, categories):
+        # Pages are added directly as live (no revisions or publish signals),
+        # so only the search index is updated for each of them
+        logging.getLogger('wagtail').setLevel(logging.WARNING)
+        for batch_start in range(start, end, 500):
+            with transaction.atomic():
+                for number in range(batch_start, min(batch_start + 500, end)):
+                    self._add_product(bench_index, number, rng, categories)
+            self.stdout.write(f'  {min(batch_start + 500, end)} products')
+
+    def _add_product(self, bench_index, number, rng, categories):
+        adjective, material, noun = rng.choice(ADJECTIVES), rng.choice(MATERIALS), rng.choice(NOUNS)
+        words = rng.sample(FILLER, 6) + [material, noun]
+        rng.shuffle(words)
+        product = ProductPage(
+            title=f'{adjective.title()} {material} {noun} {number}',
+            slug=f'bench-{number}',
+            sku=f'BENCH{number:06d}',
+            price=Decimal(rng.randint(100, 9999)),
+            category=rng.choice(categories),
+            short_description=f'{adjective} {material} {noun}',
+            description=f'<p>{" ".join(words)}</p>',
+            stock_quantity=rng.randint(0, 50),
+            is_available=rng.random() > 0.1,
+            live=True,
+            first_published_at=timezone.now(),
+        )
+        bench_index.add_child(instance=product)
+
+    def _workload(self, rng, count, size):
+        queries = []
+        for _ in range(count):
+            kind = rng.random()
+            if kind < 0.4:
+                queries.append(rng.choice(NOUNS))
+            elif kind < 0.8:
+                queries.append(f'{rng.choice(MATERIALS)} {rng.choice(NOUNS)}')
+            elif kind < 0.9:
+                queries.append(f'{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)}')
+            else:
+                queries.append(f'BENCH{rng.randrange(size):06d}')
+        return queries
+
+    def _report(self, label, queries, **filters):
+        """Time the work a results page does: the first page and the total count"""
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            results = search_products(query, **filters)
+            list(results[:24])
+            results.count()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+        self.stdout.write(
+            f'{label}: {len(timings)} queries, mean {statistics.mean(timings):.1f}ms, '
+            f'p50 {percentile(0.50):.1f}ms, p95 {percentile(0.95):.1f}ms, p99 {percentile(0.99):.1f}ms'
+        )
@@ -0,0 +1,152 @@
+"""
+Management command to build the static catalog's data files from live products
+Writes one content-hashed JSON shard per category (with precompressed .gz and,
+when brotli is installed, .br siblings) plus a manifest. Shards whose
+products haven't changed since the last build are left untouched.
+"""
+import gzip
+import hashlib
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from shop.feed import FEED_FIELDS, FEED_VERSION, feed_item
+from shop.models import Category, ProductCard
+
+try:
+    import brotli
+except ImportError:  # .br files are optional
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+UNCATEGORIZED = 'uncategorized'
+
+
+class Command(BaseCommand):
+    help = 'Build static-catalog/data from live products, rewriting only changed category shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=os.path.join(settings.BASE_DIR, 'static-catalog', 'data'),
+            help='Directory to write the manifest and shards to'
+        )
+        parser.add_argument(
+            '--base-url',
+            default=settings.SITE_URL,
+            help='Shop URL that product links and images are made absolute against'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite every shard even if its products did not change'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        base_url = options['base_url'].rstrip('/')
+        os.makedirs(output, exist_ok=True)
+
+        previous = self._read_manifest(output)
+        previous_shards = {} if options['force'] or previous.get('baseUrl') != base_url else previous.get('shards', {})
+
+        categories = {
+            row['id']: row for row in Category.objects.values('id', 'name', 'slug', 'updated_at')
+        }
+        states = (
+            ProductCard.objects.filter(is_available=True)
+            .values('category_id')
+            .annotate(latest=Max('updated_at'), total=Count('pk'))
+        )
+
+        shards, written, unchanged = {}, 0, 0
+        for state in states:
+            category = categories.get(state['category_id'])
+            key = category['slug'] if category else UNCATEGORIZED
+            # Moves with any card change in the shard and with category renames
+            signature = f"{FEED_VERSION}:{state['latest'].isoformat()}:{state['total']}:" \
+                        f"{category['updated_at'].isoformat() if category else ''}"
+
+            old = previous_shards.get(key)
+            if old and old['signature'] == signature and os.path.exists(os.path.join(output, old['file'])):
+                shards[key] = old
+                unchanged += 1
+                continue
+
+            shards[key] = self._write_shard(output, key, state['category_id'], category, signature, base_url)
+            written += 1
+
+        removed = 0
+        for key, old in previous.get('shards', {}).items():
+            if shards.get(key, {}).get('file') != old['file']:
+                removed += self._remove_shard(output, old['file'])
+
+        manifest = {
+            'version': FEED_VERSION,
+            'generatedAt': timezone.now().isoformat(),
+            'baseUrl': base_url,
+            'shards': shards,
+        }
+        self._write_atomic(os.path.join(output, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Static catalog built: {written} shard(s) written, {unchanged} unchanged, '
+            f'{removed} stale file(s) removed{"" if brotli else " (brotli not installed, skipped .br)"}'
+        ))
+
+    def _read_manifest(self, output):
+        try:
+            with open(os.path.join(output, MANIFEST_NAME), encoding='utf-8') as manifest:
+                return json.load(manifest)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_shard(self, output, key, category_id, category, signature, base_url):
+        rows = (
+            ProductCard.objects.filter(is_available=True, category_id=category_id)
+            .order_by('pk').values(*FEED_FIELDS)
+        )
+        items = []
+        for row in rows.iterator(chunk_size=500):
+            item = feed_item(row)
+            item['url'] = base_url + item['url']
+            if item['image'].startswith('/'):
+                item['image'] = base_url + item['image']
+            items.append(item)
+
+        content = json.dumps(items, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        content_hash = hashlib.sha256(content).hexdigest()[:12]
+        filename = f'{key}.{content_hash}.json'
+        path = os.path.join(output, filename)
+        if not os.path.exists(path):
+            self._write_atomic(path, content)
+            # mtime=0 keeps the .gz byte-identical across builds
+            self._write_atomic(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._write_atomic(path + '.br', brotli.compress(content))
+
+        return {
+            'file': filename,
+            'name': category['name'] if category else 'Other',
+            'count': len(items),
+            'signature': signature,
+        }
+
+    def _remove_shard(self, output, filename):
+        removed = 0
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(output, filename + suffix))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _write_atomic(self, path, content):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
@@ -0,0 +1,109 @@
+"""
+Management command to prove browsing doesn't write sessions or carts
+Crawls the storefront as a fresh anonymous visitor (no cookies) with the
+page cache off, counting every INSERT/UPDATE/DELETE the requests issue and
+every session or cart cookie they set. Any write fails the command, so it
+can run in CI. Then adds one purchasable product to check that only the cart store is
+written - never the session.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from wagtail.models import Site
+
+from shop.cart import cart_cookie_name
+from shop.cart_store import get_cart_store
+from shop.models import ProductPage, Category
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _writes(captured):
+    """The captured queries that change rows"""
+    return [
+        query['sql'] for query in captured.captured_queries
+        if query['sql'].lstrip().upper().startswith(WRITE_PREFIXES)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Check that browse-only requests write no session or cart rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=5,
+            help='Product pages to visit'
+        )
+
+    def handle(self, *args, **options):
+        site = Site.objects.filter(is_default_site=True).first()
+        host = site.hostname if site and site.hostname not in ('', '*') else 'localhost'
+        products = list(ProductPage.objects.live().order_by('pk')[:options['products']])
+        if not products:
+            raise CommandError('Need at least one live product (try: manage.py populate_sample_data)')
+
+        urls = ['/', reverse('shop:product_list'), reverse('shop:search') + '?q=a']
+        urls += [product.url for product in products]
+        urls += [
+            reverse('shop:category_detail', args=[slug])
+            for slug in Category.objects.filter(is_active=True).values_list('slug', flat=True)[:3]
+        ]
+        urls += [reverse('shop:cart_detail'), reverse('shop:cart_summary')]
+
+        # Render every page in full, as a page cache miss would
+        with override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*']):
+            client = Client(HTTP_HOST=host)
+            failures = self._browse(client, urls)
+            if failures:
+                raise CommandError(f'{len(failures)} browse request(s) wrote data:\n' + '\n'.join(failures))
+            self.stdout.write(f'{len(urls)} browse request(s): 0 writes, no session or cart cookie')
+            product = self._purchasable_product()
+            if product is None:
+                self.stdout.write(self.style.WARNING('No purchasable product, skipping the add to cart check'))
+            else:
+                self._add_to_cart(client, product)
+
+        self.stdout.write(self.style.SUCCESS('Browsing writes no sessions'))
+
+    def _browse(self, client, urls):
+        failures = []
+        for url in urls:
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url)
+            writes = _writes(captured)
+            cookies = sorted(
+                name for name in response.cookies
+                if name in (settings.SESSION_COOKIE_NAME, cart_cookie_name())
+            )
+            self.stdout.write(
+                f'  {response.status_code} {url}: {len(captured.captured_queries)} queries, {len(writes)} writes'
+            )
+            if writes or cookies:
+                failures.append(f'{url}: writes {writes}, cookies {cookies}')
+        return failures
+
+    def _purchasable_product(self):
+        """The first live product one unit of which can be added to a cart"""
+        products = ProductPage.objects.live().filter(is_available=True).order_by('pk')
+        return next((product for product in products.iterator() if product.can_purchase(1)), None)
+
+    def _add_to_cart(self, client, product):
+        """The first add creates a cart, but still no session"""
+        with CaptureQueriesContext(connection) as captured:
+            response = client.post(reverse('shop:cart_add', args=[product.pk]), {'quantity': 1})
+        try:
+            session_writes = [sql for sql in _writes(captured) if 'django_session' in sql]
+            if session_writes or settings.SESSION_COOKIE_NAME in response.cookies:
+                raise CommandError(f'Adding to the cart wrote the session: {session_writes}')
+            if cart_cookie_name() not in response.cookies:
+                raise CommandError('Adding to the cart did not set the cart cookie')
+            self.stdout.write(f'Add to cart: {len(_writes(captured))} cart store write(s), 0 session writes')
+        finally:
+            cookie = response.cookies.get(cart_cookie_name())
+            if cookie:
+                get_cart_store().clear(cookie.value)
@@ -1,6 +1,8 @@
 """
 Management command to clear all Django sessions
-Useful for clearing old sessions with incompatible data formats
+Useful for clearing old sessions with incompatible data formats.
+This logs out every visitor in one large delete - for routine cleanup
+use purge_expired_sessions instead.
 """
 from django.core.management.base import BaseCommand
 from django.contrib.sessions.models import Session
@@ -0,0 +1,39 @@
+"""
+Management command to roll the bestseller counters forward
+Run daily, shortly after midnight: recomputes each product card's
+sales_7d/30d/90d counters from the daily sales buckets and deletes
+buckets older than the longest window.
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.sales import compact_sales_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute rolling product sales counters and expire old daily sales buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Compact as of this day (YYYY-MM-DD) instead of today'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Cards read and written per batch'
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid --date: {options['date']}")
+
+        updated, expired = compact_sales_counters(today=today, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Sales counters compacted: {updated} card(s) updated, {expired} bucket(s) expired'
+        ))
@@ -0,0 +1,82 @@
+"""
+Management command to pre-generate image renditions used by the templates
+Safe to interrupt and re-run: renditions that already exist are skipped
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop.renditions import rendition_plan, missing_renditions
+
+
+def _init_worker():
+    """Make sure Django is set up in worker processes (needed with spawn)"""
+    import django
+    django.setup()
+
+
+def _render_image(job):
+    """Create the missing renditions for one image (runs in a worker)"""
+    from wagtail.images import get_image_model
+    from shop.renditions import ensure_renditions
+
+    image_id, specs = job
+    try:
+        image = get_image_model().objects.get(pk=image_id)
+        return image_id, ensure_renditions(image, specs), None
+    except Exception as e:
+        return image_id, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate renditions for product, category and home page images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Number of worker processes'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many renditions are missing'
+        )
+
+    def handle(self, *args, **options):
+        missing = missing_renditions(rendition_plan())
+        total = sum(len(specs) for specs in missing.values())
+        self.stdout.write(f'{total} missing rendition(s) across {len(missing)} image(s)')
+
+        if options['dry_run'] or not missing:
+            return
+
+        # Worker processes must open their own database connections
+        connections.close_all()
+
+        created = failed = done = 0
+        start = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            for image_id, count, error in executor.map(_render_image, missing.items(), chunksize=4):
+                done += 1
+                created += count
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'✗ Image {image_id}: {error}'))
+                if done % 100 == 0:
+                    elapsed = time.monotonic() - start
+                    self.stdout.write(f'  {done}/{len(missing)} images, {created / elapsed:.1f} renditions/s')
+
+        elapsed = time.monotonic() - start
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {created} rendition(s) for {done - failed} image(s) '
+                f'in {elapsed:.1f}s ({rate:.1f} renditions/s)'
+            )
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} image(s) failed - re-run to retry'))
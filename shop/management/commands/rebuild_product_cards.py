@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the ProductCard read model from live product pages
+Run after deploying the ProductCard migration or after bulk imports
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog import REBUILD_BATCH_SIZE, rebuild_product_cards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized product cards used by catalog listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REBUILD_BATCH_SIZE,
+            help='Products synced per transaction'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        synced, removed = rebuild_product_cards(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Synced {synced} product card(s), removed {removed} stale card(s)')
+        )
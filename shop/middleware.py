@@ -1,8 +1,12 @@
 """
 Custom middleware for shop app
 """
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
+from .cart import cart_cookie_name
+from .cart_store import cart_age
+
 
 class DisableCSRFForPaymentCallbackMiddleware(MiddlewareMixin):
     """
@@ -16,3 +20,26 @@ class DisableCSRFForPaymentCallbackMiddleware(MiddlewareMixin):
         if request.path == '/shop/payment/callback/':
             setattr(request, '_dont_enforce_csrf_checks', True)
         return None
+
+
+class CartTokenMiddleware(MiddlewareMixin):
+    """
+    Set the cart cookie when a request changed the cart.
+
+    The token is only issued on the first cart write (see Cart), so
+    visitors who never add anything don't get a cookie; every later write
+    sends it again with a fresh max_age.
+    """
+    
+    def process_response(self, request, response):
+        token = getattr(request, 'cart_token', None)
+        if token:
+            response.set_cookie(
+                cart_cookie_name(),
+                token,
+                max_age=cart_age(),
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="shop.productpage",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                (
+                    "url",
+                    models.CharField(
+                        help_text="URL path of the live product page", max_length=255
+                    ),
+                ),
+                ("short_description", models.CharField(blank=True, max_length=255)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "compare_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("discount_percentage", models.PositiveSmallIntegerField(default=0)),
+                ("is_in_stock", models.BooleanField(default=True)),
+                ("is_available", models.BooleanField(default=True)),
+                ("is_featured", models.BooleanField(default=False)),
+                ("thumbnail_url", models.CharField(blank=True, max_length=500)),
+                ("first_published_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="product_cards",
+                        to="shop.category",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["is_available", "-first_published_at", "-product"],
+                        name="shop_card_listing_idx",
+                    ),
+                    models.Index(
+                        fields=["category", "-first_published_at", "-product"],
+                        name="shop_card_category_idx",
+                    ),
+                    models.Index(
+                        fields=["is_featured", "-first_published_at", "-product"],
+                        name="shop_card_featured_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
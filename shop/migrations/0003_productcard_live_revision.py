@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0002_productcard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productcard",
+            name="live_revision_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
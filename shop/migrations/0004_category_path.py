@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:38
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model("shop", "Category")
+    categories = {c.pk: c for c in Category.objects.all()}
+
+    def build_path(category, seen=()):
+        if category.parent_id is None or category.parent_id in seen:
+            return f"{category.pk}/"
+        parent = categories[category.parent_id]
+        return build_path(parent, seen + (category.pk,)) + f"{category.pk}/"
+
+    for category in categories.values():
+        category.path = build_path(category)
+        category.depth = category.path.count("/") - 1
+    Category.objects.bulk_update(categories.values(), ["path", "depth"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0003_productcard_live_revision"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0004_category_path"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(fields=["updated_at"], name="shop_card_updated_idx"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_card_skus(apps, schema_editor):
+    ProductCard = apps.get_model("shop", "ProductCard")
+    ProductPage = apps.get_model("shop", "ProductPage")
+    ProductCard.objects.update(
+        sku=Subquery(ProductPage.objects.filter(pk=OuterRef("pk")).values("sku")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0005_productcard_updated_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productcard",
+            name="sku",
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.RunPython(populate_card_skus, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0006_productcard_sku"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productcard",
+            name="shop_card_listing_idx",
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-first_published_at", "-product"],
+                name="shop_card_listing_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["price", "product"],
+                name="shop_card_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-discount_percentage", "-product"],
+                name="shop_card_discount_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-is_in_stock", "-first_published_at", "-product"],
+                name="shop_card_in_stock_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:01
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Mirrors shop.sales.SALES_WINDOWS at the time of this migration
+SALES_WINDOWS = {"sales_7d": 7, "sales_30d": 30, "sales_90d": 90}
+PAID_STATUSES = ("paid", "processing", "shipped", "delivered")
+
+
+def seed_sales_days(apps, schema_editor):
+    """Seed the daily buckets and card counters from recent paid orders"""
+    OrderItem = apps.get_model("shop", "OrderItem")
+    ProductCard = apps.get_model("shop", "ProductCard")
+    ProductSalesDay = apps.get_model("shop", "ProductSalesDay")
+
+    today = timezone.localdate()
+    since = today - timedelta(days=max(SALES_WINDOWS.values()))
+    rows = (
+        OrderItem.objects.filter(
+            product__isnull=False,
+            order__status__in=PAID_STATUSES,
+            order__paid_at__isnull=False,
+        )
+        .annotate(day=TruncDate("order__paid_at"))
+        .filter(day__gt=since)
+        .values("product_id", "day")
+        .annotate(units=Sum("quantity"))
+    )
+    ProductSalesDay.objects.bulk_create(
+        (ProductSalesDay(**row) for row in rows.iterator()), batch_size=500
+    )
+
+    totals = ProductSalesDay.objects.values("product_id").annotate(**{
+        field: Sum("units", filter=Q(day__gt=today - timedelta(days=days)), default=0)
+        for field, days in SALES_WINDOWS.items()
+    })
+    for row in totals.iterator():
+        ProductCard.objects.filter(pk=row.pop("product_id")).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0007_productcard_sort_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSalesDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="productcard",
+            name="sales_30d",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productcard",
+            name="sales_7d",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productcard",
+            name="sales_90d",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-sales_30d", "-product"],
+                name="shop_card_bestseller_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["category", "-sales_30d", "-product"],
+                name="shop_card_cat_bestseller_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productsalesday",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="sales_days",
+                to="shop.productpage",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productsalesday",
+            index=models.Index(fields=["day"], name="shop_sales_day_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="productsalesday",
+            constraint=models.UniqueConstraint(
+                fields=("product", "day"), name="shop_sales_day_unique"
+            ),
+        ),
+        migrations.RunPython(seed_sales_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0009_productrecommendation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredCart",
+            fields=[
+                (
+                    "token",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("coupon_id", models.BigIntegerField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StoredCartLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_id", models.BigIntegerField()),
+                ("quantity", models.PositiveIntegerField()),
+                ("price_paise", models.PositiveBigIntegerField()),
+                ("sku", models.CharField(max_length=50)),
+                ("title", models.CharField(max_length=255)),
+                (
+                    "cart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="shop.storedcart",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cart", "product_id"), name="shop_cart_line_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Mirrors shop.coupons.DEFAULT_COUPON_SHARDS at the time of this migration
+DEFAULT_COUPON_SHARDS = 8
+
+
+def seed_usage_shards(apps, schema_editor):
+    """Move each coupon's used_count into shard 0 and split the remaining uses"""
+    Coupon = apps.get_model("shop", "Coupon")
+    CouponUsageShard = apps.get_model("shop", "CouponUsageShard")
+
+    count = getattr(settings, "SHOP_COUPON_SHARDS", DEFAULT_COUPON_SHARDS)
+    shards = []
+    for coupon in Coupon.objects.only("pk", "usage_limit", "used_count").iterator():
+        remaining = max(coupon.usage_limit - coupon.used_count, 0)
+        share, extra = divmod(remaining, count)
+        for index in range(count):
+            used = coupon.used_count if index == 0 else 0
+            capacity = used + share + (1 if index < extra else 0) if coupon.usage_limit else None
+            shards.append(CouponUsageShard(coupon=coupon, shard=index, used=used, capacity=capacity))
+    CouponUsageShard.objects.bulk_create(shards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0010_stored_cart"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CouponUsageShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("used", models.PositiveIntegerField(default=0)),
+                ("capacity", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "coupon",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_shards",
+                        to="shop.coupon",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("coupon", "shard"), name="shop_coupon_shard_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_usage_shards, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,35 @@
 """
 Shop models for LUVORA E-commerce
 """
+import logging
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from wagtail.models import Page
 from wagtail.fields import RichTextField
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 from wagtail.search import index
 import uuid
 
+from .money import percent_of, to_paise
+from .page_cache import cache_catalog_page
+from .pagination import KeysetPaginator
+
+logger = logging.getLogger(__name__)
+
+
+# Stable sort key for product listings; the trailing pk makes it unique
+# so keyset pagination never skips or repeats a product.
+PRODUCT_LISTING_ORDERING = ('-first_published_at', '-pk')
+
 
 class Category(models.Model):
     """Product categories for organizing products"""
@@ -35,9 +52,16 @@ class Category(models.Model):
     )
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0)
+    
+    # Materialized path of ancestor ids, e.g. "3/17/42/" - maintained in save()
+    path = models.CharField(max_length=255, db_index=True, editable=False, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    TREE_CACHE_KEY = 'shop:category-tree'
+
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['display_order', 'name']
@@ -45,14 +69,98 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.parent_id and self.pk:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self.parent_id == self.pk or (self.path and parent_path.startswith(self.path)):
+                raise ValidationError({'parent': "A category cannot be moved below itself."})
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        self._update_path()
+
+    def _update_path(self):
+        """Recompute this category's path and rewrite its subtree if it moved"""
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        new_path = f'{parent_path}{self.pk}/'
+        old_path, old_depth = Category.objects.filter(pk=self.pk).values_list('path', 'depth').get()
+        if new_path == old_path:
+            self.path, self.depth = old_path, old_depth
+            return
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError("A category cannot be moved below itself.")
+
+        new_depth = new_path.count('/') - 1
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            # Re-root all descendants in a single statement
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        self.path, self.depth = new_path, new_depth
 
     def get_absolute_url(self):
         return reverse('shop:category_detail', kwargs={'slug': self.slug})
 
+    def get_descendants(self, include_self=True):
+        """All categories in this subtree (one indexed prefix query)"""
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def get_ancestors(self):
+        """Ancestors from the root down, excluding this category"""
+        ancestor_ids = [int(pk) for pk in self.path.split('/')[:-2]]
+        ancestors = Category.objects.in_bulk(ancestor_ids)
+        return [ancestors[pk] for pk in ancestor_ids if pk in ancestors]
+
+    @classmethod
+    def get_tree(cls):
+        """
+        Cached tree of active categories for navigation.
+
+        Returns a list of root nodes; each node is a dict with id, name,
+        slug, depth and children. Rebuilt from one query when a category
+        changes (see shop.signals).
+        """
+        tree = cache.get(cls.TREE_CACHE_KEY)
+        if tree is None:
+            nodes = {}
+            tree = []
+            categories = cls.objects.filter(is_active=True).order_by('depth', 'display_order', 'name')
+            for category in categories.values('id', 'name', 'slug', 'depth', 'parent_id'):
+                node = dict(category, children=[])
+                nodes[node['id']] = node
+                if node['parent_id'] is None:
+                    tree.append(node)
+                elif node['parent_id'] in nodes:
+                    nodes[node['parent_id']]['children'].append(node)
+                # Children of inactive categories are hidden with them
+            cache.set(cls.TREE_CACHE_KEY, tree, None)
+        return tree
+
+    @classmethod
+    def get_tree_node(cls, category_id):
+        """
+        The get_tree() node of a category, or None if it is hidden.
+
+        Inactive categories and everything below them are not in the tree.
+        """
+        nodes = list(cls.get_tree())
+        while nodes:
+            node = nodes.pop()
+            if node['id'] == category_id:
+                return node
+            nodes.extend(node['children'])
+        return None
+
 
 class ProductPage(Page):
     """
@@ -208,11 +316,17 @@ class ProductPage(Page):
             self.stock_quantity = max(0, self.stock_quantity - quantity)
             self.save(update_fields=['stock_quantity'])
     
+    @method_decorator(cache_catalog_page)
+    def serve(self, request, *args, **kwargs):
+        return super().serve(request, *args, **kwargs)
+    
     def get_context(self, request):
-        """Add cart form to context"""
+        """Add cart form and recommendations to context"""
         from .forms import CartAddProductForm
+        from .recommendations import recommended_cards
         context = super().get_context(request)
         context['cart_product_form'] = CartAddProductForm()
+        context['recommendations'] = recommended_cards([self.pk])
         return context
 
 
@@ -228,12 +342,157 @@ class ProductIndexPage(Page):
     subpage_types = ['shop.ProductPage']
     
     def get_context(self, request):
+        """The same listing, facets and filters as the product_list view"""
+        from .catalog import listing_cards, get_sort, sort_context
+        from .facets import FacetSelection, facet_counts
         context = super().get_context(request)
-        # Get all live product pages
-        context['products'] = ProductPage.objects.live().public().order_by('-first_published_at')
+        # One page of live product cards, narrowed down by the facet filters
+        selection = FacetSelection(request.GET)
+        sort, ordering = get_sort(request.GET)
+        products = selection.apply(listing_cards(ordering=ordering))
+        facets = facet_counts(selection)
+        # The facet index already knows the total, so the paginator never counts
+        page = KeysetPaginator(products, ordering).get_page(request, total=facets['total'])
+        
+        # Facet filters carried over when picking a category
+        filter_params = request.GET.copy()
+        filter_params.pop('cursor', None)
+        
+        context['products'] = page.object_list
+        context['page_obj'] = page
+        context['facets'] = facets
+        context['categories'] = facets['categories']
+        context['selection'] = selection
+        context['filter_query'] = filter_params.urlencode()
+        context.update(sort_context(request, sort))
         return context
 
 
+class ProductCard(models.Model):
+    """
+    Flat, denormalized copy of the fields needed to draw a product card.
+
+    Listings read this narrow table instead of joining the Wagtail page tree.
+    Rows exist only for live, public products and are kept in sync by the
+    handlers in shop.signals (see shop.catalog.sync_product_card).
+    """
+    product = models.OneToOneField(
+        ProductPage,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card'
+    )
+    title = models.CharField(max_length=255)
+    sku = models.CharField(max_length=50, blank=True)
+    url = models.CharField(max_length=255, help_text="URL path of the live product page")
+    short_description = models.CharField(max_length=255, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    compare_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_percentage = models.PositiveSmallIntegerField(default=0)
+    is_in_stock = models.BooleanField(default=True)
+    is_available = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='product_cards'
+    )
+    thumbnail_url = models.CharField(max_length=500, blank=True)
+    live_revision_id = models.BigIntegerField(null=True, blank=True)
+    first_published_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Units sold over rolling windows - maintained by shop.sales, which
+    # leaves updated_at alone since cards look the same whatever they sell
+    sales_7d = models.PositiveIntegerField(default=0)
+    sales_30d = models.PositiveIntegerField(default=0)
+    sales_90d = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-first_published_at', '-product'], name='shop_card_category_idx'),
+            models.Index(fields=['is_featured', '-first_published_at', '-product'], name='shop_card_featured_idx'),
+            models.Index(fields=['updated_at'], name='shop_card_updated_idx'),
+            # Listing sort options (shop.catalog.PRODUCT_SORTS). Partial on
+            # is_available because Django renders filter(is_available=True) as a
+            # bare boolean, which SQLite can't match to a leading index column.
+            # Each index also serves its ordering reversed (price high to low).
+            models.Index(fields=['-first_published_at', '-product'], name='shop_card_listing_idx',
+                         condition=models.Q(is_available=True)),
+            models.Index(fields=['price', 'product'], name='shop_card_price_idx',
+                         condition=models.Q(is_available=True)),
+            models.Index(fields=['-discount_percentage', '-product'], name='shop_card_discount_idx',
+                         condition=models.Q(is_available=True)),
+            models.Index(fields=['-is_in_stock', '-first_published_at', '-product'], name='shop_card_in_stock_idx',
+                         condition=models.Q(is_available=True)),
+            models.Index(fields=['-sales_30d', '-product'], name='shop_card_bestseller_idx',
+                         condition=models.Q(is_available=True)),
+            models.Index(fields=['category', '-sales_30d', '-product'], name='shop_card_cat_bestseller_idx',
+                         condition=models.Q(is_available=True)),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ProductSalesDay(models.Model):
+    """
+    Units of a product sold on one day, the source of the card sales counters.
+
+    Buckets older than the longest counter window are deleted by the
+    compact_sales_counters command.
+    """
+    product = models.ForeignKey(
+        ProductPage,
+        on_delete=models.CASCADE,
+        related_name='sales_days'
+    )
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='shop_sales_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='shop_sales_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.units}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    One of a product's top "frequently bought together" neighbours.
+
+    Precomputed from order history by the build_recommendations command;
+    pages only read the rows, ordered by rank.
+    """
+    product = models.ForeignKey(
+        ProductPage,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    recommended = models.ForeignKey(
+        ProductPage,
+        on_delete=models.CASCADE,
+        related_name='recommended_in'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='shop_recommendation_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
+
+
 class Coupon(models.Model):
     """Discount coupons for promotions"""
     PERCENT = 'percent'
@@ -265,6 +524,9 @@ class Coupon(models.Model):
         default=0,
         help_text="0 = unlimited usage"
     )
+    # Redemptions are counted in CouponUsageShard rows (see shop.coupons);
+    # this copy is refreshed when the shards are rebalanced and when the
+    # coupon runs out, which is all is_valid needs
     used_count = models.IntegerField(default=0, editable=False)
     
     # Minimum purchase requirement
@@ -290,9 +552,13 @@ class Coupon(models.Model):
     def save(self, *args, **kwargs):
         self.code = self.code.upper()
         super().save(*args, **kwargs)
+        
+        # Spread usage_limit over the redemption counter shards
+        from .coupons import sync_usage_shards
+        sync_usage_shards(self)
     
     def is_valid(self, cart_total=None):
-        """Check if coupon is valid for use"""
+        """Check if coupon is valid for use (cart_total in paise)"""
         now = timezone.now()
         
         if not self.is_active:
@@ -304,7 +570,7 @@ class Coupon(models.Model):
         if self.usage_limit and self.used_count >= self.usage_limit:
             return False, "Coupon usage limit reached"
         
-        if cart_total and cart_total < self.minimum_purchase:
+        if cart_total and cart_total < to_paise(self.minimum_purchase):
             return False, f"Minimum purchase of ₹{self.minimum_purchase} required"
         
         return True, "Valid"
@@ -316,24 +582,88 @@ class Coupon(models.Model):
         return f"₹{self.value} OFF"
     
     def calculate_discount(self, total):
-        """Calculate discount amount for given total"""
+        """Calculate discount in paise for a total in paise"""
         if self.discount_type == self.PERCENT:
-            discount = total * (self.value / Decimal('100'))
+            discount = percent_of(total, self.value)
         else:
-            discount = self.value
+            discount = to_paise(self.value)
         
         # Discount cannot exceed total
         return min(discount, total)
     
     def apply_to_total(self, total):
-        """Apply discount and return new total"""
+        """Apply discount to a total in paise and return the new total in paise"""
         discount = self.calculate_discount(total)
-        return max(total - discount, Decimal('0.00'))
+        return max(total - discount, 0)
     
     def increment_usage(self):
-        """Increment usage count (call after successful order)"""
-        self.used_count += 1
-        self.save(update_fields=['used_count'])
+        """
+        Count one redemption (call after successful order).
+        
+        Atomic and safe under concurrent payments; see shop.coupons.
+        
+        Returns:
+            bool: False if the usage limit was already reached
+        """
+        from .coupons import redeem_coupon
+        return redeem_coupon(self)
+
+
+class CouponUsageShard(models.Model):
+    """
+    One slice of a coupon's redemption counter.
+    
+    Redemptions are spread over several rows so concurrent payments don't
+    queue on a single row; each shard may count up to its capacity, and the
+    capacities add up to the coupon's usage_limit (None = unlimited).
+    """
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='usage_shards')
+    shard = models.PositiveSmallIntegerField()
+    used = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['coupon', 'shard'], name='shop_coupon_shard_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.coupon_id} shard {self.shard}: {self.used}/{self.capacity}"
+
+
+class StoredCart(models.Model):
+    """
+    A shopping cart kept by shop.cart_store.DatabaseCartStore.
+
+    Identified by the random token in the visitor's cart cookie, so cart
+    writes never touch the session row.
+    """
+    token = models.CharField(max_length=64, primary_key=True)
+    coupon_id = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Cart {self.token[:8]}"
+
+
+class StoredCartLine(models.Model):
+    """One product line of a StoredCart, updated in place per add or remove"""
+    cart = models.ForeignKey(StoredCart, on_delete=models.CASCADE, related_name='lines')
+    # Not a foreign key: products removed from the shop stay in the cart
+    # until the visitor sees the "no longer available" message
+    product_id = models.BigIntegerField()
+    quantity = models.PositiveIntegerField()
+    price_paise = models.PositiveBigIntegerField()
+    sku = models.CharField(max_length=50)
+    title = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product_id'], name='shop_cart_line_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} x {self.quantity}"
 
 
 class Order(models.Model):
@@ -410,6 +740,18 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.order_id}"
     
+    @property
+    def subtotal_paise(self):
+        return to_paise(self.subtotal)
+    
+    @property
+    def discount_paise(self):
+        return to_paise(self.discount_amount)
+    
+    @property
+    def total_paise(self):
+        return to_paise(self.total)
+    
     def save(self, *args, **kwargs):
         if not self.order_id:
             self.order_id = self.generate_order_id()
@@ -431,14 +773,20 @@ class Order(models.Model):
         self.save()
         
         # Increment coupon usage if applicable
-        if self.coupon:
-            self.coupon.increment_usage()
+        if self.coupon and not self.coupon.increment_usage():
+            # Paid while the last use was taken by another order; the
+            # counter never goes past the limit
+            logger.warning(f"Order {self.order_id} paid with used-up coupon {self.coupon.code}")
         
         # Reduce stock for all items
         for item in self.items.all():
             if item.product:
                 item.product.reduce_stock(item.quantity)
         
+        # Count the units towards the bestseller rankings
+        from .sales import record_order_sales
+        record_order_sales(self)
+        
         # Send order confirmation email with invoice
         from .email_utils import send_order_confirmation_email
         send_order_confirmation_email(self)
@@ -475,6 +823,10 @@ class OrderItem(models.Model):
         """Get total price for this item (quantity * price)"""
         return self.line_total
     
+    @property
+    def line_total_paise(self):
+        return to_paise(self.product_price) * self.quantity
+    
     def save(self, *args, **kwargs):
         self.line_total = self.product_price * self.quantity
         super().save(*args, **kwargs)
@@ -0,0 +1,50 @@
+"""
+Money arithmetic in integer paise for shop app
+
+Amounts travel between the cart, coupons and orders as plain ints of paise
+(1 rupee = 100 paise), so totals add up exactly and cheaply. They are
+converted from Decimal model fields on the way in, and back to Decimal or
+text only where they are stored or shown.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+PAISE_PER_RUPEE = 100
+
+_ONE = Decimal('1')
+
+
+def to_paise(amount):
+    """
+    Convert a rupee amount to integer paise, rounding half up.
+
+    Args:
+        amount: Decimal, str or int number of rupees
+    """
+    if isinstance(amount, int):
+        return amount * PAISE_PER_RUPEE
+    return int((Decimal(amount) * PAISE_PER_RUPEE).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    """Exact two-place Decimal rupees, e.g. for a DecimalField"""
+    return Decimal(paise).scaleb(-2)
+
+
+def percent_of(paise, percent):
+    """
+    Percentage of an amount in paise, rounded half up to the paisa.
+
+    Args:
+        paise: Non-negative amount in paise
+        percent: Percentage as a Decimal with up to two places, e.g. 12.5
+    """
+    # Hundredths of a percent keep the whole calculation in integers
+    basis_points = to_paise(percent)
+    return (paise * basis_points + 5000) // 10000
+
+
+def format_rupees(paise):
+    """Rupees with two decimals for display, e.g. 249950 -> '2499.50'"""
+    sign = '-' if paise < 0 else ''
+    rupees, remainder = divmod(abs(paise), PAISE_PER_RUPEE)
+    return f'{sign}{rupees}.{remainder:02d}'
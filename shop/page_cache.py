@@ -0,0 +1,78 @@
+"""
+Shared full-page cache for anonymous catalog views
+
+Cached pages are rendered without any per-visitor content: base.html leaves
+holes for the cart badge and flash messages (and forms get their CSRF token
+later), and a small script fills them from the cart_summary JSON endpoint.
+All entries are dropped at once by bumping a generation counter whenever a
+product is published, a category is saved or stock changes.
+"""
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+GENERATION_KEY = 'shop:page-cache:generation'
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_KEY, generation, None)
+    return generation
+
+
+def bump_generation():
+    """Invalidate every cached catalog page"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, get_generation() + 1, None)
+
+
+def _cache_key(request):
+    path_hash = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'shop:page-cache:{get_generation()}:{request.get_host()}:{path_hash}'
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    return not (user and user.is_authenticated)
+
+
+def cache_catalog_page(view_func):
+    """
+    Serve the view from the shared page cache for anonymous visitors.
+
+    Only successful responses are stored, and only their body and content
+    type - never cookies or other per-visitor headers.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        timeout = getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', 300)
+        if not timeout or not _is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = _cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        # Tell base.html to leave holes for per-visitor content
+        request.shared_page_cache = True
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), timeout)
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    return wrapper
@@ -0,0 +1,200 @@
+"""
+Keyset (cursor) pagination for product listings
+
+Unlike OFFSET pagination, every page is fetched with an indexed range
+condition on the sort key, so page N costs the same as page 1.
+"""
+import base64
+import datetime
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps full microsecond precision for datetimes"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor cannot be decoded"""
+
+
+def approximate_count(queryset, timeout=300):
+    """
+    Return a cached row count for the queryset.
+
+    The count is shared between all visitors for `timeout` seconds, so it may
+    lag slightly behind the catalog - good enough for a "N products" label.
+    """
+    query_hash = hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+    key = f'shop:approx-count:{query_hash}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPage:
+    """A single page of results returned by KeysetPaginator"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, queryset, query_params, total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._queryset = queryset
+        self._query_params = query_params
+        if total is not None:
+            self.__dict__['approximate_total'] = total
+
+    @cached_property
+    def approximate_total(self):
+        """Total rows across all pages; only counted if a template shows it"""
+        return approximate_count(self._queryset)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _url_for(self, cursor):
+        params = self._query_params.copy()
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+    @property
+    def next_url(self):
+        return self._url_for(self.next_cursor) if self.has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url_for(self.previous_cursor) if self.has_previous else None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a stable, unique sort key.
+
+    Args:
+        queryset: Queryset to paginate
+        ordering: Sequence of field names (optionally prefixed with '-').
+            The last field must be unique (normally 'pk') so that the
+            ordering is total and no row is skipped or repeated.
+        per_page: Number of rows per page
+    """
+
+    cursor_param = 'cursor'
+
+    def __init__(self, queryset, ordering, per_page=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page or getattr(settings, 'SHOP_PRODUCTS_PER_PAGE', 24)
+        self._fields = [self._resolve_field(name.lstrip('-')) for name in self.ordering]
+
+    def _resolve_field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _encode_cursor(self, direction, row):
+        values = [getattr(row, field.attname) for field in self._fields]
+        payload = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if direction not in ('n', 'p') or len(values) != len(self._fields):
+                raise ValueError(cursor)
+            values = [field.to_python(value) for field, value in zip(self._fields, values)]
+        except Exception as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def _seek_filter(self, values, forward):
+        """
+        Build the row-value comparison `(a, b, c) > (x, y, z)` as nested
+        OR/AND conditions, honouring the direction of each ordering field.
+        """
+        condition = Q()
+        equal_prefix = Q()
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-')
+            field_name = name.lstrip('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal_prefix & Q(**{f'{field_name}__{lookup}': value})
+            equal_prefix &= Q(**{field_name: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, request, total=None):
+        """
+        Return the KeysetPage selected by the request's cursor parameter.
+
+        Args:
+            request: The current request
+            total: Total rows if the caller already knows it (e.g. from the
+                facet index), so the paginator never counts them itself
+        """
+        direction, values = None, None
+        cursor = request.GET.get(self.cursor_param)
+        if cursor:
+            try:
+                direction, values = self._decode_cursor(cursor)
+            except InvalidCursor:
+                # Stale or tampered cursor - fall back to the first page
+                pass
+
+        if direction == 'p':
+            queryset = self.queryset.filter(self._seek_filter(values, forward=False))
+            rows = list(queryset.order_by(*self._reversed_ordering())[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            queryset = self.queryset
+            if direction == 'n':
+                queryset = queryset.filter(self._seek_filter(values, forward=True))
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = direction == 'n'
+
+        next_cursor = self._encode_cursor('n', rows[-1]) if rows and has_next else None
+        previous_cursor = self._encode_cursor('p', rows[0]) if rows and has_previous else None
+
+        query_params = request.GET.copy()
+        query_params.pop(self.cursor_param, None)
+
+        return KeysetPage(
+            object_list=rows,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            queryset=self.queryset,
+            query_params=query_params,
+            total=total,
+        )
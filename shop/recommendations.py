@@ -0,0 +1,194 @@
+"""
+"Frequently bought together" recommendations for shop app
+
+The build_recommendations command turns paid order lines into a product
+co-occurrence matrix (how many orders contain both products), scores each
+pair by cosine similarity - co-occurrences over the geometric mean of the
+two products' order counts, so a bestseller doesn't top every list - and
+stores each product's top neighbours in ProductRecommendation. Pages read
+those rows in one query and compute nothing themselves.
+
+The matrix is built with NumPy/SciPy sparse matrices when they are
+installed, which keeps millions of order lines to a few seconds on one box;
+otherwise a pure Python counter gives the same results on small shops.
+"""
+import logging
+from array import array
+from collections import Counter, defaultdict
+from itertools import permutations
+from math import sqrt
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import OrderItem, ProductCard, ProductRecommendation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # the pure Python builder is used instead
+    np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+# Orders whose lines count towards recommendations
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+
+# Neighbours kept per product
+DEFAULT_TOP_K = 12
+
+# Bigger orders (bulk or wholesale buys) say little about what goes together
+MAX_BASKET_SIZE = 50
+
+# Products whose neighbour lists are replaced per transaction
+WRITE_BATCH_SIZE = 500
+
+
+def _order_lines(since=None):
+    """Return (order ids, product ids) of all paid order lines as int arrays"""
+    lines = OrderItem.objects.filter(product__isnull=False, order__status__in=PAID_STATUSES)
+    if since is not None:
+        lines = lines.filter(order__paid_at__gte=since)
+    orders, products = array('q'), array('q')
+    for order_id, product_id in lines.values_list('order_id', 'product_id').iterator(chunk_size=5000):
+        orders.append(order_id)
+        products.append(product_id)
+    return orders, products
+
+
+def _top_neighbours_sparse(orders, products, top_k, min_count):
+    order_index = np.unique(np.frombuffer(orders, dtype=np.int64), return_inverse=True)[1]
+    product_ids, product_index = np.unique(np.frombuffer(products, dtype=np.int64), return_inverse=True)
+
+    # One row per order, one column per product; repeated lines count once
+    baskets = sparse.csr_matrix(
+        (np.ones(len(product_index), dtype=np.float32), (order_index, product_index)),
+        shape=(order_index.max() + 1, len(product_ids)),
+    )
+    baskets.sum_duplicates()
+    baskets.data[:] = 1
+    sizes = np.diff(baskets.indptr)
+    baskets = baskets[sizes <= MAX_BASKET_SIZE]
+
+    counts = (baskets.T @ baskets).tocsr()
+    popularity = counts.diagonal()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+
+    neighbours = {}
+    for row in range(counts.shape[0]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        columns, together = counts.indices[start:end], counts.data[start:end]
+        keep = together >= min_count
+        columns, together = columns[keep], together[keep]
+        if not len(columns):
+            continue
+        scores = together / np.sqrt(popularity[row] * popularity[columns])
+        best = np.lexsort((product_ids[columns], -scores))[:top_k]
+        neighbours[int(product_ids[row])] = [
+            (int(product_ids[columns[i]]), float(scores[i])) for i in best
+        ]
+    return neighbours
+
+
+def _top_neighbours_python(orders, products, top_k, min_count):
+    baskets = defaultdict(set)
+    for order_id, product_id in zip(orders, products):
+        baskets[order_id].add(product_id)
+
+    popularity = Counter()
+    counts = defaultdict(Counter)
+    for basket in baskets.values():
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        popularity.update(basket)
+        for product_id, other_id in permutations(basket, 2):
+            counts[product_id][other_id] += 1
+
+    neighbours = {}
+    for product_id, others in counts.items():
+        scored = [
+            (other_id, together / sqrt(popularity[product_id] * popularity[other_id]))
+            for other_id, together in others.items()
+            if together >= min_count
+        ]
+        if scored:
+            scored.sort(key=lambda pair: (-pair[1], pair[0]))
+            neighbours[product_id] = scored[:top_k]
+    return neighbours
+
+
+def compute_recommendations(top_k=DEFAULT_TOP_K, min_count=1, since=None):
+    """
+    Score co-purchased products from the order history.
+
+    Args:
+        top_k: Neighbours kept per product
+        min_count: Orders two products must share to be paired
+        since: Only count orders paid at or after this datetime
+
+    Returns:
+        dict: {product id: [(recommended product id, score), ...]} best first
+    """
+    orders, products = _order_lines(since)
+    if not orders:
+        return {}
+    if sparse is not None:
+        return _top_neighbours_sparse(orders, products, top_k, min_count)
+    return _top_neighbours_python(orders, products, top_k, min_count)
+
+
+def save_recommendations(neighbours):
+    """
+    Replace the stored neighbour lists that changed.
+
+    Returns:
+        int: number of products whose list was rewritten
+    """
+    stored = defaultdict(list)
+    rows = ProductRecommendation.objects.order_by('product_id', 'rank').values_list('product_id', 'recommended_id')
+    for product_id, recommended_id in rows.iterator(chunk_size=5000):
+        stored[product_id].append(recommended_id)
+
+    changed = [
+        product_id for product_id in set(neighbours) | set(stored)
+        if [recommended_id for recommended_id, _ in neighbours.get(product_id, ())] != stored.get(product_id, [])
+    ]
+    for start in range(0, len(changed), WRITE_BATCH_SIZE):
+        batch = changed[start:start + WRITE_BATCH_SIZE]
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=batch).delete()
+            ProductRecommendation.objects.bulk_create(
+                ProductRecommendation(product_id=product_id, recommended_id=recommended_id, rank=rank, score=score)
+                for product_id in batch
+                for rank, (recommended_id, score) in enumerate(neighbours.get(product_id, ()))
+            )
+    return len(changed)
+
+
+def build_recommendations(top_k=DEFAULT_TOP_K, min_count=1, since=None):
+    """
+    Recompute and store every product's neighbours.
+
+    Returns:
+        tuple: (products with neighbours: int, lists rewritten: int)
+    """
+    neighbours = compute_recommendations(top_k=top_k, min_count=min_count, since=since)
+    rewritten = save_recommendations(neighbours)
+    logger.info(f"Recommendations built: {len(neighbours)} product(s), {rewritten} list(s) rewritten")
+    return len(neighbours), rewritten
+
+
+def recommended_cards(product_ids, limit=4):
+    """
+    Listable products most often bought with the given ones, best first.
+
+    One query over the precomputed neighbours; with several products (a
+    cart) the scores of shared neighbours add up.
+    """
+    product_ids = list(product_ids)
+    return (
+        ProductCard.objects.filter(is_available=True, product__recommended_in__product_id__in=product_ids)
+        .exclude(pk__in=product_ids)
+        .annotate(score=Sum('product__recommended_in__score'))
+        .order_by('-score', 'pk')[:limit]
+    )
@@ -0,0 +1,93 @@
+"""
+Pre-generation of the image renditions used by the shop templates
+
+Wagtail creates renditions lazily, so without this the first visitor after
+an upload (or a media cache wipe) pays for the Pillow resize in-request.
+"""
+import logging
+from collections import defaultdict
+from wagtail.images import get_image_model
+
+from .catalog import PRODUCT_CARD_RENDITION
+
+logger = logging.getLogger(__name__)
+
+# Filter specs used by the templates, per image field
+PRODUCT_IMAGE_RENDITIONS = (PRODUCT_CARD_RENDITION, 'original')
+CATEGORY_IMAGE_RENDITIONS = ('fill-400x300',)
+HERO_IMAGE_RENDITIONS = ('width-600',)
+
+
+def ensure_renditions(image, specs):
+    """
+    Create any of the given renditions that don't exist yet.
+
+    Returns the number of renditions that were missing.
+    """
+    existing = set(
+        image.renditions.filter(filter_spec__in=specs).values_list('filter_spec', flat=True)
+    )
+    missing = [spec for spec in specs if spec not in existing]
+    if missing:
+        image.get_renditions(*missing)
+    return len(missing)
+
+
+def ensure_renditions_safely(image, specs):
+    """ensure_renditions() for signal handlers - never breaks publishing"""
+    if image is None:
+        return 0
+    try:
+        return ensure_renditions(image, specs)
+    except Exception as e:
+        logger.warning(f"Could not pre-generate renditions for image {image.pk}: {str(e)}")
+        return 0
+
+
+def rendition_plan():
+    """
+    Collect the renditions templates need for every referenced image.
+
+    Returns:
+        dict: image id -> set of filter specs
+    """
+    from home.models import HomePage
+    from .models import Category, ProductPage
+
+    plan = defaultdict(set)
+    sources = [
+        (ProductPage.objects.live().exclude(main_image=None), 'main_image_id', PRODUCT_IMAGE_RENDITIONS),
+        (Category.objects.filter(is_active=True).exclude(image=None), 'image_id', CATEGORY_IMAGE_RENDITIONS),
+        (HomePage.objects.live().exclude(hero_image=None), 'hero_image_id', HERO_IMAGE_RENDITIONS),
+    ]
+    for queryset, field, specs in sources:
+        for image_id in queryset.values_list(field, flat=True).iterator():
+            plan[image_id].update(specs)
+    return plan
+
+
+def missing_renditions(plan, batch_size=500):
+    """
+    Drop the renditions that already exist from a rendition plan.
+
+    Returns:
+        dict: image id -> sorted list of missing filter specs, ordered by image id
+    """
+    Rendition = get_image_model().get_rendition_model()
+    all_specs = set().union(*plan.values()) if plan else set()
+    image_ids = sorted(plan)
+    existing = defaultdict(set)
+    for start in range(0, len(image_ids), batch_size):
+        rows = Rendition.objects.filter(
+            image_id__in=image_ids[start:start + batch_size], filter_spec__in=all_specs
+        ).values_list('image_id', 'filter_spec')
+        for image_id, spec in rows:
+            existing[image_id].add(spec)
+
+    missing = {}
+    for image_id in image_ids:
+        specs = plan[image_id]
+        todo = sorted(specs - existing[image_id])
+        if todo:
+            missing[image_id] = todo
+    return missing
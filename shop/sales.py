@@ -0,0 +1,122 @@
+"""
+Rolling bestseller counters for shop app
+
+Paid orders add their quantities to one ProductSalesDay bucket per product
+and day, and to the sales_7d/30d/90d counters on the product's card, so
+ranking products never aggregates the order history. Counters only grow
+during the day; the daily compact_sales_counters job recomputes them from
+the buckets as the windows roll forward and drops buckets that have left
+the longest window.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import ProductCard, ProductSalesDay
+
+logger = logging.getLogger(__name__)
+
+# Card counter field -> window length in days, today included
+SALES_WINDOWS = {
+    'sales_7d': 7,
+    'sales_30d': 30,
+    'sales_90d': 90,
+}
+LONGEST_WINDOW = max(SALES_WINDOWS.values())
+
+
+def _add_to_bucket(product_id, day, units):
+    updated = ProductSalesDay.objects.filter(product_id=product_id, day=day).update(units=F('units') + units)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            ProductSalesDay.objects.create(product_id=product_id, day=day, units=units)
+    except IntegrityError:
+        # Another order created today's bucket first
+        ProductSalesDay.objects.filter(product_id=product_id, day=day).update(units=F('units') + units)
+
+
+@transaction.atomic
+def record_order_sales(order):
+    """
+    Add the units of a paid order to the daily buckets and card counters.
+
+    Args:
+        order: Order instance that was just paid
+    """
+    units = defaultdict(int)
+    for item in order.items.all():
+        if item.product_id:
+            units[item.product_id] += item.quantity
+
+    day = timezone.localdate(order.paid_at or timezone.now())
+    for product_id, quantity in units.items():
+        _add_to_bucket(product_id, day, quantity)
+        # Today is inside every window, so each counter simply grows
+        ProductCard.objects.filter(pk=product_id).update(
+            **{field: F(field) + quantity for field in SALES_WINDOWS}
+        )
+
+
+def window_totals(product_ids=None, today=None):
+    """
+    Sum the daily buckets over each window.
+
+    Returns:
+        dict: {product id: {counter field: units}} for products with sales
+    """
+    today = today or timezone.localdate()
+    buckets = ProductSalesDay.objects.filter(day__gt=today - timedelta(days=LONGEST_WINDOW))
+    if product_ids is not None:
+        buckets = buckets.filter(product_id__in=product_ids)
+    rows = buckets.values('product_id').annotate(**{
+        field: Sum('units', filter=Q(day__gt=today - timedelta(days=days)), default=0)
+        for field, days in SALES_WINDOWS.items()
+    })
+    return {row.pop('product_id'): row for row in rows}
+
+
+def load_sales_counters(card):
+    """Fill the counters of a newly created card, e.g. on republish"""
+    totals = window_totals(product_ids=[card.pk]).get(card.pk)
+    if totals:
+        ProductCard.objects.filter(pk=card.pk).update(**totals)
+
+
+def compact_sales_counters(today=None, batch_size=500):
+    """
+    Roll every card's counters forward to today and expire old buckets.
+
+    Returns:
+        tuple: (cards updated: int, buckets deleted: int)
+    """
+    today = today or timezone.localdate()
+    recent = ProductSalesDay.objects.filter(day__gt=today - timedelta(days=LONGEST_WINDOW))
+    totals = window_totals(today=today)
+    zero = dict.fromkeys(SALES_WINDOWS, 0)
+
+    # Only cards whose counters actually changed are written
+    has_sales = Q()
+    for field in SALES_WINDOWS:
+        has_sales |= Q(**{f'{field}__gt': 0})
+    cards = ProductCard.objects.filter(Q(pk__in=recent.values('product_id')) | has_sales).values('pk', *SALES_WINDOWS)
+
+    changed = []
+    for row in cards.iterator(chunk_size=batch_size):
+        target = totals.get(row['pk'], zero)
+        if any(row[field] != target[field] for field in SALES_WINDOWS):
+            changed.append(ProductCard(pk=row['pk'], **target))
+
+    with transaction.atomic():
+        ProductCard.objects.bulk_update(changed, list(SALES_WINDOWS), batch_size=batch_size)
+        deleted, _ = ProductSalesDay.objects.filter(
+            day__lte=today - timedelta(days=LONGEST_WINDOW)
+        ).delete()
+
+    logger.info(f"Sales counters compacted: {len(changed)} card(s) updated, {deleted} bucket(s) expired")
+    return len(changed), deleted
+
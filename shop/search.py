@@ -0,0 +1,51 @@
+"""
+Product search for shop app
+
+Queries go through the Wagtail search backend configured in
+WAGTAILSEARCH_BACKENDS - PostgreSQL full-text search in production and
+SQLite FTS5 locally - using the FilterFields declared on ProductPage.
+"""
+from wagtail.search.backends import get_search_backend
+
+from .models import ProductPage, ProductCard
+
+# Longer queries are truncated rather than sent to the index as-is
+MAX_QUERY_LENGTH = 100
+
+
+def search_backend_name():
+    """Class name of the active search backend, e.g. 'PostgresSearchBackend'"""
+    return type(get_search_backend()).__name__
+
+
+def search_products(query, category=None, available_only=False):
+    """
+    Run a ranked full-text search over live, public product pages.
+
+    Args:
+        query: Search terms entered by the visitor
+        category: Optional Category; matches it and all its subcategories
+        available_only: Only return products marked as available
+
+    Returns:
+        Wagtail search results ordered by relevance
+    """
+    products = ProductPage.objects.live().public()
+    if category is not None:
+        products = products.filter(
+            category__in=list(category.get_descendants().values_list('pk', flat=True))
+        )
+    if available_only:
+        products = products.filter(is_available=True)
+    return products.search(query[:MAX_QUERY_LENGTH], order_by_relevance=True)
+
+
+def cards_for_results(products):
+    """
+    Swap a page of search results for their ProductCard rows.
+
+    Lets search results reuse the cached card fragments. Products without a
+    card (not yet synced) are left out.
+    """
+    cards = ProductCard.objects.in_bulk([product.pk for product in products])
+    return [cards[product.pk] for product in products if product.pk in cards]
@@ -0,0 +1,84 @@
+"""
+Signal handlers keeping the shop's denormalized data in sync
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+from wagtail.models import Page, PageViewRestriction
+from wagtail.signals import page_published, page_unpublished, page_slug_changed, post_page_move
+
+from .catalog import sync_product_card, sync_product_cards, sync_stock_state
+from .coupons import bump_coupon_version
+from .fragments import invalidate_card_fragments
+from .models import Category, Coupon, ProductPage
+from .page_cache import bump_generation
+from .renditions import CATEGORY_IMAGE_RENDITIONS, PRODUCT_IMAGE_RENDITIONS, ensure_renditions_safely
+
+
+@receiver(page_published, sender=ProductPage)
+@receiver(page_unpublished, sender=ProductPage)
+def product_publish_changed(sender, instance, **kwargs):
+    """Refresh the product card when a product is published or unpublished"""
+    invalidate_card_fragments(instance.pk)
+    sync_product_card(instance)
+
+
+@receiver(page_published, sender=ProductPage)
+def product_renditions(sender, instance, **kwargs):
+    """Pre-generate product image renditions so visitors never wait for them"""
+    ensure_renditions_safely(instance.main_image, PRODUCT_IMAGE_RENDITIONS)
+
+
+@receiver(post_save, sender=Category)
+def category_renditions(sender, instance, **kwargs):
+    """Pre-generate the category image rendition"""
+    ensure_renditions_safely(instance.image, CATEGORY_IMAGE_RENDITIONS)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Category names and the sidebar appear on every cached catalog page"""
+    cache.delete(Category.TREE_CACHE_KEY)
+    transaction.on_commit(bump_generation)
+
+
+@receiver(post_delete, sender=Coupon)
+def coupon_deleted(sender, instance, **kwargs):
+    """Drop the coupon from every process's active coupons (saves bump in sync_usage_shards)"""
+    transaction.on_commit(bump_coupon_version)
+
+
+@receiver(post_save, sender=ProductPage)
+def product_stock_changed(sender, instance, update_fields=None, **kwargs):
+    """Refresh the in-stock flag after ProductPage.reduce_stock()"""
+    if update_fields and 'stock_quantity' in update_fields:
+        invalidate_card_fragments(instance.pk)
+        sync_stock_state(instance)
+
+
+@receiver(post_page_move)
+@receiver(page_slug_changed)
+def page_url_changed(sender, instance, **kwargs):
+    """Moving or renaming a page changes the URLs of the products below it"""
+    sync_product_cards(ProductPage.objects.descendant_of(instance, inclusive=True))
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def view_restriction_changed(sender, instance, **kwargs):
+    """Private products must not appear in public listings"""
+    try:
+        page = instance.page
+    except Page.DoesNotExist:
+        # The restricted page itself is being deleted
+        return
+    sync_product_cards(ProductPage.objects.descendant_of(page, inclusive=True))
+
+
+@receiver(post_save, sender=get_image_model())
+def image_changed(sender, instance, **kwargs):
+    """Replacing an image file invalidates its renditions"""
+    sync_product_cards(ProductPage.objects.live().filter(main_image=instance))
@@ -0,0 +1,169 @@
+"""
+Chunked sitemaps for the product catalog
+
+Products are split into fixed id ranges (chunk N holds ids
+N * SHOP_SITEMAP_CHUNK_SIZE up to the next boundary), so a product keeps its
+chunk for life and a change only touches one chunk. The per-chunk state -
+newest last_published_at, product count and newest card update (a page
+move or slug change rewrites card URLs without republishing) - comes from
+one grouped query that is cached until the next catalog change (page cache
+generation), and each chunk's XML is cached under that state, so only
+chunks with changed pages are ever regenerated.
+"""
+import hashlib
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q
+from django.urls import reverse
+
+from .models import Category, ProductPage
+from .page_cache import get_generation
+
+# Sitemaps may hold up to 50,000 URLs
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rows fetched per keyset step while writing a chunk
+BATCH_SIZE = 1000
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def chunk_size():
+    return getattr(settings, 'SHOP_SITEMAP_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def _listed_products():
+    return ProductPage.objects.live().public()
+
+
+def chunk_states():
+    """
+    Return {chunk number: (lastmod, product count, cards changed)} for all
+    non-empty chunks.
+
+    Cached until the next catalog change.
+    """
+    key = f'shop:sitemap:states:{get_generation()}:{chunk_size()}'
+    states = cache.get(key)
+    if states is None:
+        rows = (
+            _listed_products()
+            .annotate(chunk=F('pk') / chunk_size())
+            .values('chunk')
+            .annotate(lastmod=Max('last_published_at'), total=Count('pk'), cards_changed=Max('card__updated_at'))
+            .order_by('chunk')
+        )
+        states = {row['chunk']: (row['lastmod'], row['total'], row['cards_changed']) for row in rows}
+        cache.set(key, states, CACHE_TIMEOUT)
+    return states
+
+
+def chunk_etag(state):
+    lastmod, total, cards_changed = state
+    return hashlib.sha256(f'{lastmod}:{total}:{cards_changed}'.encode('utf-8')).hexdigest()[:32]
+
+
+def chunk_last_modified(state):
+    """When a chunk's XML last changed: a publish or a card URL rewrite"""
+    return max((value for value in (state[0], state[2]) if value), default=None)
+
+
+def index_etag(states):
+    signature = ','.join(f'{chunk}:{chunk_etag(state)}' for chunk, state in sorted(states.items()))
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()[:32]
+
+
+def _url_entry(location, lastmod=None):
+    entry = f'<url><loc>{escape(location)}</loc>'
+    if lastmod:
+        entry += f'<lastmod>{lastmod.date().isoformat()}</lastmod>'
+    return entry + '</url>'
+
+
+def render_index(base_url, states):
+    """Sitemap index listing the catalog sitemap and every product chunk"""
+    parts = [XML_HEADER, f'<sitemapindex xmlns="{SITEMAP_NS}">']
+    parts.append(f'<sitemap><loc>{escape(base_url)}/sitemap-catalog.xml</loc></sitemap>')
+    for chunk, state in sorted(states.items()):
+        lastmod = chunk_last_modified(state)
+        parts.append(f'<sitemap><loc>{escape(base_url)}/sitemap-products-{chunk}.xml</loc>')
+        if lastmod:
+            parts.append(f'<lastmod>{lastmod.isoformat()}</lastmod>')
+        parts.append('</sitemap>')
+    parts.append('</sitemapindex>')
+    return ''.join(parts)
+
+
+def _generate_chunk(base_url, chunk):
+    size = chunk_size()
+    products = _listed_products().filter(pk__gte=chunk * size, pk__lt=(chunk + 1) * size)
+    parts = [XML_HEADER, f'<urlset xmlns="{SITEMAP_NS}">']
+    last_pk = None
+    while True:
+        batch = products.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch.values('pk', 'card__url', 'last_published_at')[:BATCH_SIZE])
+        for row in rows:
+            if row['card__url']:
+                parts.append(_url_entry(base_url + row['card__url'], row['last_published_at']))
+        if len(rows) < BATCH_SIZE:
+            break
+        last_pk = rows[-1]['pk']
+    parts.append('</urlset>')
+    return ''.join(parts)
+
+
+def render_chunk(base_url, chunk, state):
+    """Product sitemap for one chunk, regenerated only when its state changes"""
+    key = f'shop:sitemap:chunk:{chunk_size()}:{chunk}:{chunk_etag(state)}:{base_url}'
+    content = cache.get(key)
+    if content is None:
+        content = _generate_chunk(base_url, chunk)
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
+
+
+def catalog_state():
+    """
+    Return (newest category change, category count, active count) for the
+    catalog sitemap.
+
+    Cached until the next catalog change.
+    """
+    key = f'shop:sitemap:catalog-state:{get_generation()}'
+    state = cache.get(key)
+    if state is None:
+        row = Category.objects.aggregate(
+            lastmod=Max('updated_at'), total=Count('pk'), active=Count('pk', filter=Q(is_active=True))
+        )
+        state = (row['lastmod'], row['total'], row['active'])
+        cache.set(key, state, CACHE_TIMEOUT)
+    return state
+
+
+def catalog_sitemap_etag(state):
+    lastmod, total, active = state
+    return hashlib.sha256(f'catalog:{lastmod}:{total}:{active}'.encode('utf-8')).hexdigest()[:32]
+
+
+def render_catalog(base_url):
+    """Sitemap of the shop listing pages: product list and active categories"""
+    key = f'shop:sitemap:catalog:{get_generation()}:{base_url}'
+    content = cache.get(key)
+    if content is None:
+        parts = [XML_HEADER, f'<urlset xmlns="{SITEMAP_NS}">']
+        parts.append(_url_entry(base_url + reverse('shop:product_list')))
+        for category in Category.objects.filter(is_active=True).order_by('path').only('slug', 'updated_at'):
+            parts.append(_url_entry(
+                base_url + reverse('shop:category_detail', kwargs={'slug': category.slug}),
+                category.updated_at,
+            ))
+        parts.append('</urlset>')
+        content = ''.join(parts)
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
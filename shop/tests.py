@@ -0,0 +1,672 @@
+"""
+Tests for shop app
+"""
+import re
+from datetime import timedelta
+from io import StringIO
+from decimal import Decimal
+from importlib import import_module
+from unittest import skipUnless
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.middleware.csrf import _unmask_cipher_token
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from wagtail.models import Page, Site
+
+from .cart import cart_cookie_name
+from .cart_store import DEFAULT_CART_STORE, DatabaseCartStore, cart_age, get_cart_store
+from .catalog import rebuild_product_cards, sync_product_card
+from .coupons import (
+    VERSION_KEY, ActiveCoupons, get_active_coupon, get_active_coupon_by_id, redeem_coupon, usage_count,
+)
+from .facets import facet_index
+from .models import Category, Coupon, ProductCard, ProductIndexPage, ProductPage, StoredCart, StoredCartLine
+from .typeahead import TypeaheadIndex, product_terms, typeahead_index
+
+TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]*)"')
+
+
+def reset_catalog_state():
+    """Clear the shared cache and make this process's card indexes reload from the test's cards"""
+    cache.clear()
+    for card_index in (facet_index, typeahead_index):
+        card_index.built = False
+
+
+def create_shop_index():
+    """A product index page under the root, served by the default site on localhost"""
+    root = Page.get_first_root_node()
+    Site.objects.update_or_create(
+        is_default_site=True, defaults={'hostname': 'localhost', 'root_page': root}
+    )
+    return root.add_child(instance=ProductIndexPage(title='Shop', slug='shop-test'))
+
+
+def create_product(index, number=0, **fields):
+    """A live, in-stock product page below the index"""
+    defaults = {
+        'title': f'Test Lamp {number}',
+        'slug': f'test-lamp-{number}',
+        'sku': f'TEST-LAMP-{number}',
+        'price': Decimal('499.00'),
+        'stock_quantity': 10,
+        'first_published_at': timezone.now(),
+    }
+    defaults.update(fields)
+    return index.add_child(instance=ProductPage(**defaults))
+
+
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=300, ALLOWED_HOSTS=['*'])
+class SharedPageCacheCsrfTests(TestCase):
+    """Pages from the shared page cache must not hand one visitor's CSRF token to another"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product(create_shop_index())
+
+    def setUp(self):
+        reset_catalog_state()
+
+    def _visit(self):
+        """A new anonymous visitor's product page token and the token cart_summary gives them"""
+        client = Client(HTTP_HOST='localhost')
+        response = client.get(self.product.url)
+        self.assertEqual(response.status_code, 200)
+        page_tokens = TOKEN_RE.findall(response.content.decode())
+        summary = client.get(reverse('shop:cart_summary')).json()
+        return client, page_tokens, summary['csrf_token']
+
+    def test_anonymous_visitors_never_share_a_token(self):
+        client_a, page_a, token_a = self._visit()
+        client_b, page_b, token_b = self._visit()
+
+        # Both pages came from one cache entry and carry no token of their own
+        self.assertTrue(page_a)
+        self.assertEqual(page_a, page_b)
+        self.assertEqual(set(page_a), {''})
+
+        # Each visitor's token comes from their own CSRF secret
+        secret_a = client_a.cookies[settings.CSRF_COOKIE_NAME].value
+        secret_b = client_b.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertNotEqual(secret_a, secret_b)
+        self.assertEqual(_unmask_cipher_token(token_a), secret_a)
+        self.assertEqual(_unmask_cipher_token(token_b), secret_b)
+
+
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*'])
+class ProductListCountTests(TestCase):
+    """The listing's product count comes from the facet index alone"""
+
+    @classmethod
+    def setUpTestData(cls):
+        sync_product_card(create_product(create_shop_index()))
+
+    def setUp(self):
+        reset_catalog_state()
+
+    def test_listing_runs_no_count_query(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('shop:product_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['facets']['total'], 1)
+        counts = [query['sql'] for query in captured.captured_queries if 'COUNT(*)' in query['sql']]
+        self.assertEqual(counts, [])
+
+
+
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*'])
+class ProductIndexPageTests(TestCase):
+    """The Wagtail product index page renders the same listing as product_list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.index = create_shop_index()
+        cls.lamps = Category.objects.create(name='Lamps', slug='lamps')
+        sync_product_card(create_product(cls.index, 0, category=cls.lamps, price=Decimal('499.00')))
+        sync_product_card(create_product(cls.index, 1, category=cls.lamps, price=Decimal('1499.00')))
+
+    def setUp(self):
+        reset_catalog_state()
+
+    def _get(self, **params):
+        response = self.client.get(self.index.url, params, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_sidebar_and_total_come_from_facets(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self._get()
+            self.assertEqual(response.context['page_obj'].approximate_total, 2)
+        self.assertEqual(response.context['facets']['total'], 2)
+        counts = [query['sql'] for query in captured.captured_queries if 'COUNT(*)' in query['sql']]
+        self.assertEqual(counts, [])
+        self.assertEqual([node['count'] for node in response.context['categories']], [2])
+        self.assertContains(response, '2 products')
+        self.assertContains(response, 'Lamps')
+
+    def test_facet_filters_narrow_the_listing(self):
+        response = self._get(price='under-500')
+        self.assertEqual([card.sku for card in response.context['products']], ['TEST-LAMP-0'])
+        self.assertEqual(response.context['facets']['total'], 1)
+        self.assertEqual(response.context['filter_query'], 'price=under-500')
+
+    def test_sort_orders_the_listing(self):
+        response = self._get(sort='price-desc')
+        self.assertEqual([card.sku for card in response.context['products']], ['TEST-LAMP-1', 'TEST-LAMP-0'])
+        self.assertEqual(response.context['current_sort'], 'price-desc')
+        self.assertContains(response, '<option value="price-desc" selected>')
+
+        response = self._get(sort='price')
+        self.assertEqual([card.sku for card in response.context['products']], ['TEST-LAMP-0', 'TEST-LAMP-1'])
+
+
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*'])
+class InactiveCategoryTests(TestCase):
+    """Listings and facet counts leave out inactive categories and everything below them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        index = create_shop_index()
+        cls.lamps = Category.objects.create(name='Lamps', slug='lamps')
+        floor = Category.objects.create(name='Floor Lamps', slug='floor-lamps', parent=cls.lamps)
+        cls.desk = Category.objects.create(name='Desk Lamps', slug='desk-lamps', parent=cls.lamps, is_active=False)
+        cls.reading = Category.objects.create(name='Reading Lamps', slug='reading-lamps', parent=cls.desk)
+        for number, category in enumerate([cls.lamps, floor, cls.desk, cls.reading]):
+            sync_product_card(create_product(index, number, category=category))
+
+    def setUp(self):
+        reset_catalog_state()
+
+    def test_listing_matches_the_counts(self):
+        response = self.client.get(reverse('shop:product_list'), {'category': 'lamps'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(card.sku for card in response.context['products']), ['TEST-LAMP-0', 'TEST-LAMP-1'])
+        self.assertEqual(response.context['facets']['total'], 2)
+        self.assertEqual(response.context['categories'][0]['count'], 2)
+
+        response = self.client.get(reverse('shop:category_detail', args=['lamps']))
+        self.assertEqual(sorted(card.sku for card in response.context['products']), ['TEST-LAMP-0', 'TEST-LAMP-1'])
+
+    def test_hidden_categories_are_not_found(self):
+        for slug in ('desk-lamps', 'reading-lamps'):
+            with self.subTest(slug=slug):
+                response = self.client.get(reverse('shop:product_list'), {'category': slug})
+                self.assertEqual(response.status_code, 404)
+                response = self.client.get(reverse('shop:category_detail', args=[slug]))
+                self.assertEqual(response.status_code, 404)
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class CatalogSitemapTests(TestCase):
+    """The catalog sitemap answers conditional requests like the product chunks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamps = Category.objects.create(name='Lamps', slug='lamps')
+
+    def setUp(self):
+        reset_catalog_state()
+
+    def test_conditional_get(self):
+        url = reverse('sitemap_catalog')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Rugs', slug='rugs')
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, '/rugs/')
+
+
+class RebuildProductCardsTests(TestCase):
+    """Rebuilding the read model commits in batches and bumps once per batch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.index = create_shop_index()
+        for number in range(5):
+            create_product(cls.index, number)
+
+    def test_rebuild_bumps_once_per_batch(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            synced, removed = rebuild_product_cards(batch_size=2)
+        self.assertEqual((synced, removed), (5, 0))
+        self.assertEqual(ProductCard.objects.count(), 5)
+        # Three batches of generation + version bumps, then the stale card cleanup
+        self.assertEqual(
+            [callback.__name__ for callback in callbacks],
+            ['bump_generation', 'bump_version'] * 3 + ['bump_generation', 'request_rebuild'],
+        )
+
+    def test_unpublished_live_pages_get_a_listing_date(self):
+        # Live pages added without a publish have no first_published_at
+        product = create_product(self.index, 5, first_published_at=None)
+        synced, removed = rebuild_product_cards(batch_size=2)
+        self.assertEqual((synced, removed), (6, 0))
+        card = ProductCard.objects.get(pk=product.pk)
+        self.assertIsNotNone(card.first_published_at)
+
+
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*'])
+class BrowseSessionWriteTests(TestCase):
+    """Browsing never writes the session; adding to the cart writes only the cart store"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.index = create_shop_index()
+        cls.category = Category.objects.create(name='Lamps', slug='lamps')
+        cls.product = create_product(cls.index, category=cls.category)
+        sync_product_card(cls.product)
+
+    def setUp(self):
+        reset_catalog_state()
+        self.client = Client(HTTP_HOST='localhost')
+
+    def _writes(self, captured):
+        return [
+            query['sql'] for query in captured.captured_queries
+            if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'REPLACE'))
+        ]
+
+    def test_browse_only_requests_write_nothing(self):
+        urls = [
+            self.index.url,
+            reverse('shop:product_list'),
+            reverse('shop:product_list') + '?price=under-500&sort=price',
+            reverse('shop:search') + '?q=lamp',
+            self.product.url,
+            reverse('shop:category_detail', args=[self.category.slug]),
+            reverse('shop:cart_detail'),
+            reverse('shop:cart_summary'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as captured:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self._writes(captured), [])
+                self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+                self.assertNotIn(cart_cookie_name(), response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_add_to_cart_writes_no_session(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('shop:cart_add', args=[self.product.pk]), {'quantity': 1})
+        self.assertRedirects(response, reverse('shop:cart_detail'), fetch_redirect_response=False)
+        self.assertEqual([sql for sql in self._writes(captured) if 'django_session' in sql], [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIn(cart_cookie_name(), response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+
+class TypeaheadCapTests(SimpleTestCase):
+    """Over the entry cap, the typeahead index keeps its most valuable terms"""
+
+    def _row(self, pk, title, sku, sales_30d):
+        return {
+            'pk': pk, 'title': title, 'sku': sku, 'url': f'/p/{pk}/', 'price': Decimal('10.00'),
+            'thumbnail_url': '', 'is_in_stock': True, 'is_available': True, 'sales_30d': sales_30d,
+        }
+
+    def test_cap_keeps_primary_terms_of_best_sellers(self):
+        index = TypeaheadIndex(max_entries=3)
+        index.load([
+            self._row(1, 'Alpha Beta Lamp', 'AB-1', sales_30d=0),
+            self._row(2, 'Zebra Lamp', 'ZL-1', sales_30d=10),
+        ])
+        self.assertEqual(len(index.entries), 3)
+        self.assertEqual(index.entries, sorted(index.entries))
+        # Both primary terms of the best seller, even at the end of the alphabet
+        self.assertEqual([item['id'] for item in index.suggest('zebra')], [2])
+        self.assertEqual([item['id'] for item in index.suggest('zl1')], [2])
+        # No later title word displaced a primary term
+        self.assertEqual([rank for _, rank, _ in index.entries], [0, 0, 0])
+
+    def test_uncapped_index_has_every_term(self):
+        index = TypeaheadIndex(max_entries=100)
+        index.load([self._row(1, 'Alpha Beta Lamp', 'AB-1', sales_30d=0)])
+        self.assertEqual([item['id'] for item in index.suggest('lamp')], [1])
+        self.assertEqual(index.terms[1], product_terms(self._row(1, 'Alpha Beta Lamp', 'AB-1', 0)))
+
+
+def create_coupon(code='SAVE10', usage_limit=10, **fields):
+    """A coupon valid from yesterday to tomorrow"""
+    now = timezone.now()
+    defaults = {
+        'code': code,
+        'discount_type': Coupon.PERCENT,
+        'value': Decimal('10'),
+        'valid_from': now - timedelta(days=1),
+        'valid_to': now + timedelta(days=1),
+        'usage_limit': usage_limit,
+    }
+    defaults.update(fields)
+    return Coupon.objects.create(**defaults)
+
+
+@override_settings(SHOP_COUPON_SHARDS=4)
+class CouponRedemptionTests(TestCase):
+    """Sharded coupon redemption counts every use and never passes usage_limit"""
+
+    def _redeem(self, coupon, times):
+        return [redeem_coupon(coupon) for _ in range(times)]
+
+    def _capacities(self, coupon):
+        return list(coupon.usage_shards.order_by('shard').values_list('capacity', flat=True))
+
+    def test_limit_is_split_over_the_shards(self):
+        coupon = create_coupon(usage_limit=10)
+        self.assertEqual(self._capacities(coupon), [3, 3, 2, 2])
+
+    def test_redeems_up_to_the_limit_then_refuses(self):
+        coupon = create_coupon(usage_limit=10)
+        self.assertEqual(self._redeem(coupon, 10), [True] * 10)
+        self.assertEqual(usage_count(coupon), 10)
+
+        # The last use marks the coupon used up straight away
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 10)
+        self.assertEqual(coupon.is_valid(), (False, "Coupon usage limit reached"))
+
+        self.assertEqual(self._redeem(coupon, 3), [False] * 3)
+        self.assertEqual(usage_count(coupon), 10)
+
+    def test_unlimited_coupon_never_refuses(self):
+        coupon = create_coupon(usage_limit=0)
+        self.assertEqual(self._capacities(coupon), [None] * 4)
+        self.assertEqual(self._redeem(coupon, 25), [True] * 25)
+        self.assertEqual(usage_count(coupon), 25)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.is_valid(), (True, "Valid"))
+
+    def test_raising_the_limit_keeps_counted_uses(self):
+        coupon = create_coupon(usage_limit=4)
+        self._redeem(coupon, 4)
+        coupon.refresh_from_db()
+        coupon.usage_limit = 10
+        coupon.save()
+
+        self.assertEqual(coupon.used_count, 4)
+        self.assertEqual(sum(self._capacities(coupon)), 10)
+        self.assertEqual(coupon.is_valid(), (True, "Valid"))
+        self.assertEqual(self._redeem(coupon, 7), [True] * 6 + [False])
+        self.assertEqual(usage_count(coupon), 10)
+
+    def test_lowering_the_limit_leaves_only_the_difference(self):
+        coupon = create_coupon(usage_limit=10)
+        self._redeem(coupon, 4)
+        coupon.usage_limit = 6
+        coupon.save()
+        self.assertEqual(sum(self._capacities(coupon)), 6)
+        self.assertEqual(self._redeem(coupon, 3), [True, True, False])
+        self.assertEqual(usage_count(coupon), 6)
+
+    def test_lowering_the_limit_below_the_uses_refuses(self):
+        coupon = create_coupon(usage_limit=10)
+        self._redeem(coupon, 6)
+        coupon.usage_limit = 5
+        coupon.save()
+        self.assertEqual(coupon.is_valid(), (False, "Coupon usage limit reached"))
+        self.assertEqual(self._redeem(coupon, 1), [False])
+        self.assertEqual(usage_count(coupon), 6)
+
+    def test_coupon_created_without_save_gets_its_shards(self):
+        Coupon.objects.bulk_create([Coupon(
+            code='BULK', discount_type=Coupon.FIXED, value=Decimal('50'), usage_limit=2,
+            valid_from=timezone.now() - timedelta(days=1), valid_to=timezone.now() + timedelta(days=1),
+        )])
+        coupon = Coupon.objects.get(code='BULK')
+        self.assertEqual(self._redeem(coupon, 3), [True, True, False])
+        self.assertEqual(coupon.usage_shards.count(), 4)
+
+    def test_migration_moves_used_count_into_shard_zero(self):
+        migration = import_module('shop.migrations.0011_coupon_usage_shards')
+        Coupon.objects.bulk_create([Coupon(
+            code='OLD', discount_type=Coupon.PERCENT, value=Decimal('10'), usage_limit=10, used_count=7,
+            valid_from=timezone.now() - timedelta(days=1), valid_to=timezone.now() + timedelta(days=1),
+        )])
+        migration.seed_usage_shards(apps, None)
+
+        coupon = Coupon.objects.get(code='OLD')
+        shards = list(coupon.usage_shards.order_by('shard').values_list('used', 'capacity'))
+        self.assertEqual(shards, [(7, 8), (0, 1), (0, 1), (0, 0)])
+        self.assertEqual(self._redeem(coupon, 4), [True, True, True, False])
+        self.assertEqual(usage_count(coupon), 10)
+
+
+@override_settings(SHOP_COUPON_CACHE_TTL=60)
+class ActiveCouponCacheTests(TestCase):
+    """Coupon changes bump the shared version, so every process reloads its copy"""
+
+    def setUp(self):
+        cache.clear()
+        self.coupon = create_coupon()
+        self.coupons = ActiveCoupons()
+        self.coupons.refresh()
+
+    def _change(self, **fields):
+        """Save the coupon with new field values, running its on_commit callbacks"""
+        version = cache.get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.coupon, name, value)
+            self.coupon.save()
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+        self.coupons.refresh()
+
+    def test_copy_is_kept_until_the_version_changes(self):
+        # A write that bypasses save() doesn't bump the version
+        Coupon.objects.filter(pk=self.coupon.pk).update(value=Decimal('50'))
+        self.coupons.refresh()
+        self.assertEqual(self.coupons.by_code['SAVE10'].value, Decimal('10'))
+
+    def test_saving_reloads_the_coupon(self):
+        self._change(value=Decimal('25'))
+        self.assertEqual(self.coupons.by_code['SAVE10'].value, Decimal('25'))
+        self.assertEqual(self.coupons.by_id[self.coupon.pk].value, Decimal('25'))
+
+    def test_deactivating_drops_the_coupon(self):
+        self._change(is_active=False)
+        self.assertNotIn('SAVE10', self.coupons.by_code)
+        self.assertNotIn(self.coupon.pk, self.coupons.by_id)
+
+    def test_expiring_drops_the_coupon(self):
+        self._change(valid_to=timezone.now() - timedelta(minutes=1))
+        self.assertNotIn('SAVE10', self.coupons.by_code)
+
+    def test_running_out_reloads_the_used_count(self):
+        version = cache.get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                redeem_coupon(self.coupon)
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+        self.coupons.refresh()
+        self.assertEqual(self.coupons.by_code['SAVE10'].is_valid(), (False, "Coupon usage limit reached"))
+
+    def test_deleting_drops_the_coupon(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.delete()
+        self.coupons.refresh()
+        self.assertNotIn('SAVE10', self.coupons.by_code)
+
+    def test_lookup_helpers_reload_in_the_same_process(self):
+        self.assertEqual(get_active_coupon('save10').value, Decimal('10'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.value = Decimal('30')
+            self.coupon.save()
+        self.assertEqual(get_active_coupon('SAVE10').value, Decimal('30'))
+        self.assertEqual(get_active_coupon_by_id(self.coupon.pk).value, Decimal('30'))
+
+
+class DatabaseCartStoreTests(TestCase):
+    """Per-line cart writes and expiry in StoredCart rows"""
+
+    token = 'a' * 43
+    lamp = {'price_paise': 49900, 'sku': 'LAMP', 'title': 'Lamp'}
+
+    def setUp(self):
+        self.store = DatabaseCartStore()
+
+    def test_unknown_cart_is_empty(self):
+        self.assertEqual(self.store.load(self.token), ({}, None))
+        self.assertFalse(StoredCart.objects.exists())
+
+    def test_add_increments_and_override_sets(self):
+        self.store.add_line(self.token, 7, self.lamp, 2)
+        self.store.add_line(self.token, 7, dict(self.lamp, price_paise=1, title='Changed'), 3)
+        lines, _ = self.store.load(self.token)
+        # Price and title are kept from when the line was added
+        self.assertEqual(lines, {'7': dict(self.lamp, quantity=5)})
+
+        self.store.add_line(self.token, 7, self.lamp, 1, override=True)
+        self.assertEqual(self.store.load(self.token)[0]['7']['quantity'], 1)
+
+    def test_remove_line_and_coupon(self):
+        coupon = create_coupon()
+        self.store.add_line(self.token, 7, self.lamp, 1)
+        self.store.add_line(self.token, 8, dict(self.lamp, sku='LAMP2'), 1)
+        self.store.set_coupon_id(self.token, coupon.pk)
+        self.store.remove_line(self.token, 7)
+        lines, coupon_id = self.store.load(self.token)
+        self.assertEqual(list(lines), ['8'])
+        self.assertEqual(coupon_id, coupon.pk)
+
+        self.store.set_coupon_id(self.token, None)
+        self.assertIsNone(self.store.load(self.token)[1])
+
+    def test_clear_deletes_the_cart_and_lines(self):
+        self.store.add_line(self.token, 7, self.lamp, 1)
+        self.store.clear(self.token)
+        self.assertFalse(StoredCart.objects.exists())
+        self.assertFalse(StoredCartLine.objects.exists())
+
+    def test_every_write_renews_the_cart(self):
+        self.store.add_line(self.token, 7, self.lamp, 1)
+        long_ago = timezone.now() - timedelta(days=60)
+        for write in (
+            lambda: self.store.add_line(self.token, 7, self.lamp, 1),
+            lambda: self.store.remove_line(self.token, 7),
+            lambda: self.store.set_coupon_id(self.token, None),
+        ):
+            StoredCart.objects.filter(token=self.token).update(updated_at=long_ago)
+            write()
+            self.assertGreater(StoredCart.objects.get(token=self.token).updated_at, long_ago)
+
+    def test_delete_stale_drops_only_old_carts(self):
+        old_token, fresh_token = 'o' * 43, 'f' * 43
+        self.store.add_line(old_token, 7, self.lamp, 1)
+        self.store.add_line(fresh_token, 7, self.lamp, 1)
+        StoredCart.objects.filter(token=old_token).update(updated_at=timezone.now() - timedelta(days=31))
+
+        before = timezone.now() - timedelta(seconds=cart_age())
+        self.assertEqual(self.store.delete_stale(before), 1)
+        self.assertEqual(self.store.delete_stale(before), 0)
+        self.assertEqual(self.store.load(old_token), ({}, None))
+        self.assertEqual(list(self.store.load(fresh_token)[0]), ['7'])
+
+    def test_delete_stale_respects_the_limit(self):
+        for letter in 'abc':
+            self.store.add_line(letter * 43, 7, self.lamp, 1)
+        StoredCart.objects.update(updated_at=timezone.now() - timedelta(days=31))
+        before = timezone.now() - timedelta(days=30)
+        self.assertEqual(self.store.delete_stale(before, limit=2), 2)
+        self.assertEqual(self.store.delete_stale(before, limit=2), 1)
+        self.assertFalse(StoredCart.objects.exists())
+
+
+@skipUnless(
+    getattr(settings, 'SHOP_CART_STORE', DEFAULT_CART_STORE) == DEFAULT_CART_STORE,
+    'Checks StoredCart rows of the database cart store',
+)
+@override_settings(SHOP_PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*'])
+class CartCookieTests(TestCase):
+    """The cart is found by the token in its own cookie, and old session carts move into the store"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product(create_shop_index())
+
+    def setUp(self):
+        reset_catalog_state()
+        self.client = Client(HTTP_HOST='localhost')
+
+    def _count(self):
+        return self.client.get(reverse('shop:cart_summary')).json()['count']
+
+    def test_add_sets_the_cookie_and_later_requests_find_the_cart(self):
+        response = self.client.post(reverse('shop:cart_add', args=[self.product.pk]), {'quantity': 2})
+        cookie = response.cookies[cart_cookie_name()]
+        self.assertEqual(cookie['max-age'], cart_age())
+        self.assertTrue(cookie['httponly'])
+        self.assertEqual(self._count(), 2)
+
+        lines, _ = get_cart_store().load(cookie.value)
+        self.assertEqual(lines[str(self.product.pk)]['quantity'], 2)
+
+    def test_unknown_or_malformed_token_is_an_empty_cart(self):
+        for token in ('b' * 43, 'not a token', '../' * 20):
+            with self.subTest(token=token):
+                self.client.cookies[cart_cookie_name()] = token
+                response = self.client.get(reverse('shop:cart_summary'))
+                self.assertEqual(response.json()['count'], 0)
+                self.assertNotIn(cart_cookie_name(), response.cookies)
+        self.assertFalse(StoredCart.objects.exists())
+
+    def test_legacy_session_cart_moves_into_the_store(self):
+        coupon = create_coupon()
+        session = self.client.session
+        session['cart'] = {
+            str(self.product.pk): {'quantity': 3, 'price': '499.00', 'sku': 'TEST-LAMP-0', 'title': 'Test Lamp 0'},
+        }
+        session['coupon_id'] = coupon.pk
+        session.save()
+
+        response = self.client.get(reverse('shop:cart_summary'))
+        self.assertEqual(response.json()['count'], 3)
+        token = response.cookies[cart_cookie_name()].value
+        lines, coupon_id = get_cart_store().load(token)
+        self.assertEqual(lines, {str(self.product.pk): {
+            'quantity': 3, 'price_paise': 49900, 'sku': 'TEST-LAMP-0', 'title': 'Test Lamp 0',
+        }})
+        self.assertEqual(coupon_id, coupon.pk)
+
+        # The session no longer holds the cart, so it is imported only once
+        session = self.client.session
+        self.assertNotIn('cart', session)
+        self.assertNotIn('coupon_id', session)
+        self.assertEqual(self._count(), 3)
+        self.assertEqual(StoredCart.objects.count(), 1)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class PurgeExpiredSessionsTests(TestCase):
+    """Expired sessions are purged in keyset batches; live ones are kept"""
+
+    def test_batches_continue_from_the_last_key(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(session_key=f'expired{number}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='expired2a', session_data='', expire_date=now + timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_expired_sessions', batch_size=2, sleep=0, skip_carts=True, stdout=StringIO())
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['expired2a'])
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'django_session' in q['sql']]
+        self.assertEqual(len(selects), 3)
+        self.assertNotIn('"session_key" >', selects[0])
+        self.assertIn('"session_key" >', selects[1])
+        self.assertIn("'expired1'", selects[1])
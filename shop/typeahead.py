@@ -0,0 +1,155 @@
+"""
+In-process typeahead index for product titles and SKUs
+
+Every suggestable term is kept in one sorted list of (term, rank, product
+id) tuples, so a prefix lookup is a bisect plus a short forward scan - no
+database query per keystroke. Terms are the full title, the SKU and the
+title from each later word on ("bluetooth headphones", "headphones"), so
+typing any word of a title finds it.
+
+Each worker builds the index when it starts (see luvora_project/wsgi.py)
+and follows card changes through CardIndex.
+"""
+import bisect
+import logging
+import re
+from django.conf import settings
+from django.db import DatabaseError
+
+from .card_index import CardIndex
+
+logger = logging.getLogger(__name__)
+
+# Title and SKU prefixes rank above matches on a later title word
+RANK_PRIMARY = 0
+RANK_WORD = 1
+
+# Later title words indexed per product
+MAX_TITLE_WORDS = 6
+
+# Entries scanned per lookup, bounds the cost of one-letter queries
+MAX_SCAN = 200
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase and keep only word characters, single-space separated"""
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def product_terms(row, primary_only=False):
+    """Index terms of one ProductCard row as (term, rank) pairs"""
+    terms = set()
+    title = normalize(row['title'])
+    if title:
+        terms.add((title, RANK_PRIMARY))
+    if row['sku']:
+        terms.add((normalize(row['sku']).replace(' ', ''), RANK_PRIMARY))
+    if not primary_only:
+        words = title.split(' ')
+        for start in range(1, min(len(words), MAX_TITLE_WORDS + 1)):
+            terms.add((' '.join(words[start:]), RANK_WORD))
+    return terms
+
+
+class TypeaheadIndex(CardIndex):
+    """Sorted-array prefix index over product titles and SKUs"""
+
+    fields = ('pk', 'title', 'sku', 'url', 'price', 'thumbnail_url', 'is_in_stock', 'is_available', 'sales_30d')
+
+    def __init__(self, max_entries=None):
+        super().__init__()
+        self.max_entries = max_entries or getattr(settings, 'SHOP_TYPEAHEAD_MAX_ENTRIES', 200000)
+        self.entries = []
+        self.terms = {}
+        self.suggestions = {}
+
+    @staticmethod
+    def _suggestion(row):
+        return {
+            'id': row['pk'],
+            'title': row['title'],
+            'sku': row['sku'],
+            'url': row['url'],
+            'price': str(row['price']),
+            'thumbnail_url': row['thumbnail_url'],
+            'is_in_stock': row['is_in_stock'],
+        }
+
+    def load(self, rows):
+        rows = [row for row in rows if row['is_available']]
+        # Over the memory cap, keep the most valuable terms: titles and SKUs
+        # before later title words, best sellers first within each
+        rows.sort(key=lambda row: (-row['sales_30d'], row['pk']))
+        weighted = sorted(
+            (rank, popularity, term, row['pk'])
+            for popularity, row in enumerate(rows) for term, rank in product_terms(row)
+        )[:self.max_entries]
+
+        terms = {row['pk']: set() for row in rows}
+        for rank, _, term, pk in weighted:
+            terms[pk].add((term, rank))
+        # Alphabetical for prefix lookups
+        self.entries = sorted((term, rank, pk) for rank, _, term, pk in weighted)
+        self.terms = terms
+        self.suggestions = {row['pk']: self._suggestion(row) for row in rows}
+
+    def _remove(self, pk):
+        for term, rank in self.terms.pop(pk, ()):
+            position = bisect.bisect_left(self.entries, (term, rank, pk))
+            if position < len(self.entries) and self.entries[position] == (term, rank, pk):
+                del self.entries[position]
+        self.suggestions.pop(pk, None)
+
+    def update(self, row):
+        self._remove(row['pk'])
+        if not row['is_available']:
+            return
+        terms = product_terms(row, primary_only=len(self.entries) >= self.max_entries)
+        for term, rank in terms:
+            bisect.insort(self.entries, (term, rank, row['pk']))
+        self.terms[row['pk']] = terms
+        self.suggestions[row['pk']] = self._suggestion(row)
+
+    def suggest(self, query, limit=8):
+        """
+        Return up to `limit` suggestions whose title, SKU or a title word
+        starts with the query; title and SKU prefix matches come first.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        # SKUs are indexed without spaces
+        prefixes = {prefix, prefix.replace(' ', '')}
+
+        matches = {}
+        for prefix in prefixes:
+            position = bisect.bisect_left(self.entries, (prefix,))
+            end = min(position + MAX_SCAN, len(self.entries))
+            while position < end and self.entries[position][0].startswith(prefix):
+                term, rank, pk = self.entries[position]
+                if rank < matches.get(pk, (rank + 1,))[0]:
+                    matches[pk] = (rank, term)
+                position += 1
+
+        ranked = sorted(matches, key=lambda pk: (matches[pk], pk))
+        return [self.suggestions[pk] for pk in ranked[:limit]]
+
+
+typeahead_index = TypeaheadIndex()
+
+
+def suggest_products(query, limit=8):
+    """Typeahead suggestions for a partial product title or SKU"""
+    typeahead_index.refresh()
+    return typeahead_index.suggest(query, limit=limit)
+
+
+def warm_typeahead_index():
+    """Build the index up front so the first keystroke doesn't pay for it"""
+    try:
+        typeahead_index.refresh()
+    except DatabaseError as e:
+        # e.g. before the first migrate - the index is built on first use instead
+        logger.warning(f"Could not build typeahead index: {str(e)}")
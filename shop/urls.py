@@ -11,16 +11,28 @@ urlpatterns = [
     path('', views.product_list, name='product_list'),
     path('product/<int:pk>/<slug:slug>/', views.product_detail, name='product_detail'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.suggest, name='suggest'),
+    
+    # Catalog feed
+    path('api/products.json', views.product_feed, name='product_feed'),
     
     # Cart URLs
     path('cart/', views.cart_detail, name='cart_detail'),
     path('cart/add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('cart/remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
+    path('cart/summary/', views.cart_summary, name='cart_summary'),
     
     # Coupon URLs
     path('cart/coupon/apply/', views.coupon_apply, name='coupon_apply'),
     path('cart/coupon/remove/', views.coupon_remove, name='coupon_remove'),
     
+    # JSON cart API (progressive enhancement of the cart forms)
+    path('api/cart/add/<int:product_id>/', views.cart_api_add, name='cart_api_add'),
+    path('api/cart/remove/<int:product_id>/', views.cart_api_remove, name='cart_api_remove'),
+    path('api/cart/coupon/apply/', views.cart_api_coupon_apply, name='cart_api_coupon_apply'),
+    path('api/cart/coupon/remove/', views.cart_api_coupon_remove, name='cart_api_coupon_remove'),
+    
     # Checkout URLs
     path('checkout/', views.checkout, name='checkout'),
     path('payment/callback/', views.payment_callback, name='payment_callback'),  # Must be before payment/<order_id>/
@@ -7,47 +7,82 @@ import hashlib
 import json
 from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_safe, condition
 from django.contrib import messages
 from django.conf import settings
+from django.core.paginator import Paginator
 from django.urls import reverse
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseForbidden, StreamingHttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import never_cache
+from django.middleware.csrf import get_token
 from django.utils.decorators import method_decorator
 from django.views import View
 import razorpay
 import logging
 
 from .models import ProductPage, Category, Order, OrderItem, Coupon
-from .cart import Cart
+from .cart import get_cart
+from .catalog import listing_cards, get_sort, sort_context
+from .feed import catalog_etag, stream_catalog
+from .facets import FacetSelection, facet_counts
 from .forms import CartAddProductForm, CouponApplyForm, CheckoutForm
+from .page_cache import cache_catalog_page
+from .money import format_rupees, from_paise
+from .pagination import KeysetPaginator
+from .recommendations import recommended_cards
+from .search import search_products, cards_for_results
+from . import sitemaps
+from .typeahead import suggest_products
 
 logger = logging.getLogger(__name__)
 
 
+def _visible_category(slug):
+    """The category with this slug, or 404 if it or a parent is inactive"""
+    category = get_object_or_404(Category, slug=slug, is_active=True)
+    if Category.get_tree_node(category.pk) is None:
+        raise Http404("Category not found")
+    return category
+
+
+@cache_catalog_page
 def product_list(request):
-    """Display all products"""
-    products = ProductPage.objects.live().public().filter(is_available=True)
-    
+    """Display all products, narrowed down by category and facet filters"""
     # Filter by category if provided
     category_slug = request.GET.get('category')
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
+        category = _visible_category(category_slug)
     else:
         category = None
+    selection = FacetSelection(request.GET)
+    sort, ordering = get_sort(request.GET)
+    products = selection.apply(listing_cards(category=category, ordering=ordering))
+    
+    # Sidebar counts come from the facet index, not from COUNT queries
+    facets = facet_counts(selection, category)
     
-    # Get all categories for sidebar
-    categories = Category.objects.filter(is_active=True)
+    page = KeysetPaginator(products, ordering).get_page(request, total=facets['total'])
+    
+    # Facet filters carried over when switching category
+    filter_params = request.GET.copy()
+    for param in ('category', 'cursor'):
+        filter_params.pop(param, None)
     
     context = {
-        'products': products,
-        'categories': categories,
+        'products': page.object_list,
+        'page_obj': page,
+        'facets': facets,
+        'categories': facets['categories'],
+        'selection': selection,
+        'filter_query': filter_params.urlencode(),
         'selected_category': category,
+        **sort_context(request, sort),
     }
     return render(request, 'shop/product_list.html', context)
 
 
+@cache_catalog_page
 def product_detail(request, pk, slug):
     """Display product detail"""
     product = get_object_or_404(
@@ -60,32 +95,49 @@ def product_detail(request, pk, slug):
     context = {
         'product': product,
         'cart_product_form': cart_product_form,
+        'recommendations': recommended_cards([product.pk]),
     }
     return render(request, 'shop/product_detail.html', context)
 
 
+def _add_to_cart(request, cart, product):
+    """
+    Validate the add-to-cart form and add the product.
+    
+    Returns:
+        tuple: (success: bool, message: str or None - None for an invalid form)
+    """
+    form = CartAddProductForm(request.POST)
+    if not form.is_valid():
+        return False, None
+    
+    cd = form.cleaned_data
+    quantity = cd['quantity']
+    
+    # Check if product can be purchased
+    if not product.can_purchase(quantity):
+        return False, f"Sorry, {product.title} is out of stock or insufficient quantity available."
+    
+    cart.add(
+        product=product,
+        quantity=quantity,
+        override_quantity=cd['override']
+    )
+    return True, f"{product.title} added to cart!"
+
+
 @require_POST
 def cart_add(request, product_id):
     """Add product to cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(ProductPage, id=product_id)
-    form = CartAddProductForm(request.POST)
+    success, message = _add_to_cart(request, cart, product)
     
-    if form.is_valid():
-        cd = form.cleaned_data
-        quantity = cd['quantity']
-        
-        # Check if product can be purchased
-        if not product.can_purchase(quantity):
-            messages.error(request, f"Sorry, {product.title} is out of stock or insufficient quantity available.")
-            return redirect('shop:product_detail', pk=product.id, slug=product.slug)
-        
-        cart.add(
-            product=product,
-            quantity=quantity,
-            override_quantity=cd['override']
-        )
-        messages.success(request, f"{product.title} added to cart!")
+    if success:
+        messages.success(request, message)
+    elif message:
+        messages.error(request, message)
+        return redirect('shop:product_detail', pk=product.id, slug=product.slug)
     
     return redirect('shop:cart_detail')
 
@@ -93,7 +145,7 @@ def cart_add(request, product_id):
 @require_POST
 def cart_remove(request, product_id):
     """Remove product from cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(ProductPage, id=product_id)
     cart.remove(product)
     messages.success(request, f"{product.title} removed from cart.")
@@ -102,7 +154,7 @@ def cart_remove(request, product_id):
 
 def cart_detail(request):
     """Display cart contents"""
-    cart = Cart(request)
+    cart = get_cart(request)
     
     # Validate cart items
     is_valid, errors = cart.validate_items()
@@ -116,21 +168,39 @@ def cart_detail(request):
     
     # Update cart items with forms for quantity update
     cart_items = []
-    for item in cart:
-        item['update_quantity_form'] = CartAddProductForm(
-            initial={'quantity': item['quantity'], 'override': True}
+    for line in cart:
+        line.update_quantity_form = CartAddProductForm(
+            initial={'quantity': line.quantity, 'override': True}
         )
-        cart_items.append(item)
+        cart_items.append(line)
     
     context = {
         'cart': cart,
         'cart_items': cart_items,
         'coupon_form': coupon_form,
         'is_cart_valid': is_valid,
+        'recommendations': recommended_cards(int(line.product_id) for line in cart_items),
     }
     return render(request, 'shop/cart_detail.html', context)
 
 
+@never_cache
+def cart_summary(request):
+    """
+    Per-visitor data for pages served from the shared page cache:
+    cart badge count, pending flash messages and a CSRF token for forms.
+    """
+    cart = get_cart(request)
+    return JsonResponse({
+        'count': len(cart),
+        'messages': [
+            {'tags': message.tags, 'text': str(message)}
+            for message in messages.get_messages(request)
+        ],
+        'csrf_token': get_token(request),
+    })
+
+
 @require_POST
 def coupon_apply(request):
     """Apply coupon code to cart"""
@@ -138,7 +208,7 @@ def coupon_apply(request):
     
     if form.is_valid():
         code = form.cleaned_data['code']
-        cart = Cart(request)
+        cart = get_cart(request)
         success, message, coupon = cart.apply_coupon(code)
         
         if success:
@@ -151,15 +221,82 @@ def coupon_apply(request):
 
 def coupon_remove(request):
     """Remove coupon from cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     cart.remove_coupon()
     messages.info(request, "Coupon removed from cart.")
     return redirect('shop:cart_detail')
 
 
+def _cart_json(cart, success, message, product_id=None):
+    """
+    Cart state after a change, for the JSON cart endpoints: the changed line
+    (None once removed), totals, discount and badge count, with amounts as
+    rupee strings. Computed from the stored lines, without loading products.
+    """
+    line = cart.get_line(product_id) if product_id is not None else None
+    if line:
+        line = {
+            'product_id': int(line.product_id),
+            'quantity': line.quantity,
+            'price': format_rupees(line.unit_paise),
+            'total': format_rupees(line.total_paise),
+        }
+    subtotal = cart.get_subtotal_paise()
+    discount = cart.get_discount_paise()
+    coupon = cart.coupon
+    return JsonResponse({
+        'success': success,
+        'message': message,
+        'line': line,
+        'count': len(cart),
+        'quantity': cart.get_total_quantity(),
+        'subtotal': format_rupees(subtotal),
+        'discount': format_rupees(discount),
+        'total': format_rupees(subtotal - discount),
+        'coupon': coupon.code if coupon else None,
+    }, status=200 if success else 400)
+
+
+@require_POST
+def cart_api_add(request, product_id):
+    """Add product to cart or set its quantity (JSON)"""
+    cart = get_cart(request)
+    product = get_object_or_404(ProductPage, id=product_id)
+    success, message = _add_to_cart(request, cart, product)
+    return _cart_json(cart, success, message or "Please enter a valid quantity.", product.id)
+
+
+@require_POST
+def cart_api_remove(request, product_id):
+    """Remove product from cart (JSON)"""
+    cart = get_cart(request)
+    product = get_object_or_404(ProductPage, id=product_id)
+    cart.remove(product)
+    return _cart_json(cart, True, f"{product.title} removed from cart.", product.id)
+
+
+@require_POST
+def cart_api_coupon_apply(request):
+    """Apply coupon code to cart (JSON)"""
+    cart = get_cart(request)
+    form = CouponApplyForm(request.POST)
+    if not form.is_valid():
+        return _cart_json(cart, False, "Please enter a coupon code.")
+    success, message, coupon = cart.apply_coupon(form.cleaned_data['code'])
+    return _cart_json(cart, success, message)
+
+
+@require_POST
+def cart_api_coupon_remove(request):
+    """Remove coupon from cart (JSON)"""
+    cart = get_cart(request)
+    cart.remove_coupon()
+    return _cart_json(cart, True, "Coupon removed from cart.")
+
+
 def checkout(request):
     """Checkout page"""
-    cart = Cart(request)
+    cart = get_cart(request)
     
     if len(cart) == 0:
         messages.warning(request, "Your cart is empty.")
@@ -180,13 +317,12 @@ def checkout(request):
             order = form.save(commit=False)
             
             # Calculate totals
-            subtotal = cart.get_total_price()
-            discount = cart.get_discount()
-            total = cart.get_total_price_after_discount()
+            subtotal = cart.get_subtotal_paise()
+            discount = cart.get_discount_paise()
             
-            order.subtotal = subtotal
-            order.discount_amount = discount
-            order.total = total
+            order.subtotal = from_paise(subtotal)
+            order.discount_amount = from_paise(discount)
+            order.total = from_paise(subtotal - discount)
             
             # Apply coupon if exists
             if cart.coupon:
@@ -195,16 +331,19 @@ def checkout(request):
             
             order.save()
             
-            # Create order items
-            for item in cart:
-                OrderItem.objects.create(
+            # Create order items (bulk_create skips save(), so set line_total here)
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=item['product'],
-                    product_sku=item['sku'],
-                    product_name=item['title'],
-                    product_price=float(item['price']),  # Convert Decimal to float for JSON serialization
-                    quantity=item['quantity']
+                    product=line.product,
+                    product_sku=line.sku,
+                    product_name=line.title,
+                    product_price=from_paise(line.unit_paise),
+                    quantity=line.quantity,
+                    line_total=from_paise(line.total_paise),
                 )
+                for line in cart
+            ])
             
             # Store order id in session for payment
             request.session['order_id'] = order.id
@@ -239,7 +378,7 @@ def payment(request, order_id):
         # Create Razorpay order
         try:
             razorpay_order = client.order.create({
-                'amount': int(order.total * 100),  # Amount in paise
+                'amount': order.total_paise,  # Amount in paise
                 'currency': 'INR',
                 'receipt': order.order_id,
                 'payment_capture': 1
@@ -252,7 +391,7 @@ def payment(request, order_id):
                 'order': order,
                 'razorpay_order_id': razorpay_order['id'],
                 'razorpay_key_id': settings.RAZORPAY_KEY_ID,
-                'amount': int(order.total * 100),
+                'amount': order.total_paise,
                 'currency': 'INR',
                 'callback_url': request.build_absolute_uri(reverse('shop:payment_callback')),
             }
@@ -299,7 +438,7 @@ def test_payment(request, order_id):
         order.mark_as_paid(test_payment_id, test_signature)
         
         # Clear cart
-        cart = Cart(request)
+        cart = get_cart(request)
         cart.clear()
         
         # Clear order from session
@@ -363,7 +502,7 @@ def payment_callback(request):
         order.mark_as_paid(razorpay_payment_id, razorpay_signature)
         
         # Clear cart
-        cart = Cart(request)
+        cart = get_cart(request)
         cart.clear()
         
         # Clear order from session
@@ -399,21 +538,123 @@ def payment_failed(request):
     return render(request, 'shop/payment_failed.html')
 
 
+@cache_catalog_page
 def category_detail(request, slug):
     """Display products in a category"""
-    category = get_object_or_404(Category, slug=slug, is_active=True)
-    products = ProductPage.objects.live().public().filter(
-        category=category,
-        is_available=True
-    )
+    category = _visible_category(slug)
+    # Includes products from all subcategories
+    sort, ordering = get_sort(request.GET)
+    products = listing_cards(category=category, ordering=ordering)
+    page = KeysetPaginator(products, ordering).get_page(request)
     
     context = {
         'category': category,
-        'products': products,
+        'ancestors': category.get_ancestors(),
+        'products': page.object_list,
+        'page_obj': page,
+        **sort_context(request, sort),
     }
     return render(request, 'shop/category_detail.html', context)
 
 
+def search(request):
+    """Full-text product search with category and availability filters"""
+    query = request.GET.get('q', '').strip()
+    category_slug = request.GET.get('category')
+    category = None
+    if category_slug:
+        category = Category.objects.filter(slug=category_slug, is_active=True).first()
+    available_only = request.GET.get('available') == '1'
+    
+    page = None
+    products = []
+    if query:
+        results = search_products(query, category=category, available_only=available_only)
+        per_page = getattr(settings, 'SHOP_PRODUCTS_PER_PAGE', 24)
+        page = Paginator(results, per_page).get_page(request.GET.get('page'))
+        products = cards_for_results(page.object_list)
+    
+    # Filters carried over by the pagination links
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'query': query,
+        'products': products,
+        'page_obj': page,
+        'categories': Category.get_tree(),
+        'selected_category': category,
+        'available_only': available_only,
+        'query_string': query_params.urlencode(),
+    }
+    return render(request, 'shop/search_results.html', context)
+
+
+def suggest(request):
+    """Typeahead suggestions for a partial product title or SKU (JSON)"""
+    query = request.GET.get('q', '').strip()[:100]
+    results = suggest_products(query) if len(query) >= 2 else []
+    response = JsonResponse({'query': query, 'results': results})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+@require_safe
+@condition(etag_func=catalog_etag)
+def product_feed(request):
+    """
+    Live catalog as a JSON array, streamed from the database.
+    Revalidation with If-None-Match gets a 304 while the catalog is unchanged.
+    """
+    response = StreamingHttpResponse(stream_catalog(), content_type='application/json; charset=utf-8')
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+def _site_base_url(request):
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def _sitemap_response(content):
+    response = HttpResponse(content, content_type='application/xml; charset=utf-8')
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def _chunk_state(chunk):
+    return sitemaps.chunk_states().get(chunk)
+
+
+@require_safe
+@condition(etag_func=lambda request: sitemaps.index_etag(sitemaps.chunk_states()))
+def sitemap_index(request):
+    """Sitemap index pointing at the catalog and product chunk sitemaps"""
+    return _sitemap_response(sitemaps.render_index(_site_base_url(request), sitemaps.chunk_states()))
+
+
+@require_safe
+@condition(
+    etag_func=lambda request: sitemaps.catalog_sitemap_etag(sitemaps.catalog_state()),
+    last_modified_func=lambda request: sitemaps.catalog_state()[0],
+)
+def sitemap_catalog(request):
+    """Sitemap of the product list and category pages"""
+    return _sitemap_response(sitemaps.render_catalog(_site_base_url(request)))
+
+
+@require_safe
+@condition(
+    etag_func=lambda request, chunk: sitemaps.chunk_etag(_chunk_state(chunk)) if _chunk_state(chunk) else None,
+    last_modified_func=lambda request, chunk: sitemaps.chunk_last_modified(_chunk_state(chunk)) if _chunk_state(chunk) else None,
+)
+def sitemap_products(request, chunk):
+    """Product sitemap for one fixed id range"""
+    state = _chunk_state(chunk)
+    if state is None:
+        raise Http404("No such sitemap")
+    return _sitemap_response(sitemaps.render_chunk(_site_base_url(request), chunk, state))
+
+
 @csrf_exempt
 def razorpay_webhook(request):
     """
@@ -10,6 +10,11 @@ if (window.location.pathname.includes('products.html')) {
         currentProducts = await loadProducts();
         filteredProducts = [...currentProducts];
         
+        // Categories of a built catalog come from its manifest
+        if (catalogManifest) {
+            renderCategoryFilters(catalogManifest);
+        }
+        
         // Display all products initially
         displayCatalogProducts();
         
@@ -39,6 +44,26 @@ function displayCatalogProducts() {
     }
 }
 
+function renderCategoryFilters(manifest) {
+    const allFilter = document.querySelector('input[name="category"][value="all"]');
+    if (!allFilter) return;
+    const options = allFilter.closest('.filter-options');
+    options.querySelectorAll('input[name="category"]:not([value="all"])').forEach(input => {
+        input.closest('label').remove();
+    });
+    Object.values(manifest.shards).forEach(shard => {
+        const label = document.createElement('label');
+        const input = document.createElement('input');
+        input.type = 'radio';
+        input.name = 'category';
+        input.value = shard.name;
+        const text = document.createElement('span');
+        text.textContent = `${shard.name} (${shard.count})`;
+        label.append(input, text);
+        options.appendChild(label);
+    });
+}
+
 function setupFilters() {
     // Category filter
     const categoryFilters = document.querySelectorAll('input[name="category"]');
@@ -2,12 +2,48 @@
 
 let allProducts = [];
 
+// Where the catalog comes from. Set window.LUVORA_CATALOG_URL before this
+// script to read the live shop feed, e.g. https://shop.example.com/shop/api/products.json
+const CATALOG_URL = window.LUVORA_CATALOG_URL || null;
+
+// Built by `python manage.py build_static_catalog`: one file per category
+const MANIFEST_URL = 'data/manifest.json';
+
+// Manifest of the built catalog, if there is one
+let catalogManifest = null;
+
+async function fetchJSON(url) {
+    const response = await fetch(url, {cache: 'no-cache'});
+    if (!response.ok) {
+        throw new Error(`${url}: ${response.status}`);
+    }
+    return response.json();
+}
+
+// Load the category shards listed in the manifest (all of them by default)
+async function loadShards(manifest, keys = Object.keys(manifest.shards)) {
+    const shards = await Promise.all(
+        keys.map(key => fetch('data/' + manifest.shards[key].file).then(response => response.json()))
+    );
+    return shards.flat();
+}
+
 // Load products from JSON
 async function loadProducts() {
     try {
-        const response = await fetch('data/products.json');
-        allProducts = await response.json();
-        return allProducts;
+        if (CATALOG_URL) {
+            allProducts = await fetchJSON(CATALOG_URL);
+            return allProducts;
+        }
+        try {
+            catalogManifest = await fetchJSON(MANIFEST_URL);
+            allProducts = await loadShards(catalogManifest);
+            return allProducts;
+        } catch (error) {
+            // No built catalog - fall back to the hand-maintained file
+            allProducts = await fetchJSON('data/products.json');
+            return allProducts;
+        }
     } catch (error) {
         console.error('Error loading products:', error);
         return [];